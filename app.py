@@ -1,8 +1,273 @@
+import os
+import smtplib
+
 import streamlit as st
 import pandas as pd
-import io
+
+from engine import (
+    build_salary_report, compute_salary, detect_mapping, find_date_col, normalize_names, prepare_mfs,
+)
+from export import ReportExports, format_for_display
+from ingest import (
+    common_columns, content_hash, load_audit_cube, load_audit_headers, load_combined_audit, load_streamed_audit,
+    load_typed_audit, read_csv_header,
+)
+from ledger import LEDGER_PATH, PayrollLedger
+from mfs import sheet_loader
+from profiling import StageProfiler, enable_json_logs, stage
+from scenarios import MAX_SWEEP_CELLS, SWEEP_FORMATS, PayrollSweep, render_sweep, scenario_grid, sweep_filename
+from slips import SlipMailer, cached_slips, send_slips, slip_recipients, zip_slips
+
+payroll_ledger = PayrollLedger(LEDGER_PATH)
+
+
+def display_column_config():
+    return {
+        '% Mismatch in Re-Audit': st.column_config.NumberColumn(format="%d%%"),
+    }
+
+
+def filter_widgets(audit_cube):
+    # Sidebar date-range / region filters. Returns (start, end, regions), each
+    # None when that filter is left at "everything".
+    first_day, last_day = audit_cube.days()
+    regions = audit_cube.regions()
+    if first_day is None and len(regions) < 2:
+        return None, None, None
+
+    st.sidebar.markdown("---")
+    st.sidebar.subheader("🗓️ Filters")
+    start = end = selected_regions = None
+
+    if first_day is not None:
+        date_range = st.sidebar.date_input(
+            "Visit date range", value=(first_day, last_day), min_value=first_day, max_value=last_day,
+        )
+        if len(date_range) == 2 and tuple(date_range) != (first_day, last_day):
+            start, end = date_range
+
+    if len(regions) > 1:
+        chosen = st.sidebar.multiselect("Regions", regions, default=regions)
+        if set(chosen) != set(regions):
+            selected_regions = chosen
+
+    return start, end, selected_regions
+
+
+def process_upload(audit_files, stream_ingest):
+    # Column mapping UI plus the cached parse/aggregate of one or more uploads
+    # --- Process Audit Data ---
+    streamed = stream_ingest and len(audit_files) == 1 and audit_files[0].name.lower().endswith('.csv')
+    if streamed:
+        # Only the header is read here; the mapped columns are streamed below
+        all_cols = read_csv_header(audit_files[0])
+    else:
+        # Header-only pass; the files are parsed (concurrently) once the mapping is known
+        if stream_ingest:
+            st.sidebar.caption("Low-memory mode applies to single CSV uploads only.")
+        all_cols = common_columns(load_audit_headers(audit_files))
+        if not all_cols:
+            st.error("⚠️ The uploaded files have no columns in common.")
+            st.stop()
+
+    # Ensure we have column mapping for flexibility
+    st.sidebar.markdown("---")
+    st.sidebar.subheader("⚙️ Column Mapping")
+
+    # Suggestion/Help Box
+    with st.sidebar.expander("📘 Definitive Mapping Guide"):
+        st.markdown("""
+        | Target Column | Description | Key Requirement |
+        | :--- | :--- | :--- |
+        | **Auditor Name** | The person who performed the primary audit. | Unique Text/Name |
+        | **Visit ID** | The specific identifier for each site visit. | Unique ID / String |
+        | **Re-Audited** | Whether a second check (re-audit) was done. | True/False or Yes/No |
+        | **Mismatch** | If the re-audit found a discrepancy. | True/False or Yes/No |
+
+        ---
+        *Note: The app prioritizes `assigned_to`, `visit_id`, `re_audited`, and `mismatch_found_in_reaudit` automatically.*
+        """)
+
+    default_assigned, default_visit, default_reaudit, default_mismatch = detect_mapping(all_cols)
+
+    # Mapping Selectors with specific defaults
+    col_assigned = st.sidebar.selectbox("Auditor Name Column", all_cols, 
+                                       index=all_cols.index(default_assigned))
+    col_visit = st.sidebar.selectbox("Visit ID Column", all_cols, 
+                                    index=all_cols.index(default_visit))
+    col_reaudit = st.sidebar.selectbox("Re-Audited Column", all_cols, 
+                                      index=all_cols.index(default_reaudit))
+    col_mismatch = st.sidebar.selectbox("Mismatch Column", all_cols, 
+                                       index=all_cols.index(default_mismatch))
+
+    # Typed frame, header and counts are cached per (upload, mapping)
+    if streamed:
+        audit_key = content_hash(audit_files[0])
+        parsed_audit = load_streamed_audit(audit_key, audit_files[0], (col_assigned, col_visit, col_reaudit, col_mismatch))
+    else:
+        # Each file is parsed once per content hash; a visit present in several files counts once
+        audit_key, df_audit, source_rows = load_combined_audit(audit_files, col_assigned, col_visit)
+        parsed_audit = load_typed_audit(audit_key, df_audit, col_assigned, col_visit, col_reaudit, col_mismatch)
+        if len(audit_files) > 1:
+            st.sidebar.caption(f"📂 {len(audit_files)} files combined: {len(df_audit):,} rows, "
+                               f"{source_rows - len(df_audit):,} duplicate visit rows dropped")
+    df_audit = parsed_audit['df']
+    header_title = parsed_audit['header_title']
+    header_date_range = parsed_audit['header_date_range']
+    auditor_performance = parsed_audit['performance']
+    if parsed_audit['memory_mb']:
+        raw_mb, typed_mb = parsed_audit['memory_mb']
+        st.sidebar.caption(f"🧮 Audit data in memory: {raw_mb:,.1f} MB raw → {typed_mb:,.1f} MB typed")
+
+    # --- Filters ---
+    if df_audit is not None:
+        audit_cube = load_audit_cube(audit_key, df_audit, (col_assigned, col_visit, col_reaudit, col_mismatch))
+        filter_start, filter_end, filter_regions = filter_widgets(audit_cube)
+        if (filter_start, filter_end, filter_regions) != (None, None, None):
+            # Only the pre-aggregated cells are re-rolled, not the raw rows
+            with stage('filter_cube', rows=len(audit_cube.cells)):
+                auditor_performance = audit_cube.performance(col_assigned, filter_start, filter_end, filter_regions)
+                header_title, header_date_range = audit_cube.date_header(filter_start, filter_end, filter_regions)
+    else:
+        st.sidebar.caption("Date and region filters are not available in low-memory mode.")
+
+    # --- Payroll Ledger ---
+    if df_audit is not None and st.sidebar.button("📒 Add this upload to the payroll ledger", use_container_width=True):
+        result = payroll_ledger.ingest(
+            df_audit, (col_assigned, col_visit, col_reaudit, col_mismatch),
+            find_date_col(df_audit.columns), source=', '.join(f.name for f in audit_files),
+        )
+        st.sidebar.success(f"Ledger: {result['new_visits']} new visits added, {result['known_visits']} already recorded.")
+
+    return auditor_performance, col_assigned, header_title, header_date_range
+
+
+def salary_slip_panel(excel_df, header_title, header_date_range, df_mfs):
+    # One slip per auditor: bulk ZIP download and SMTP delivery. Slips are
+    # rendered once per report in a process pool and shared by both actions.
+    with st.expander("✉️ Salary Slips"):
+        def slips():
+            return cached_slips(excel_df, header_title, header_date_range)
+
+        st.download_button(
+            label="Download all salary slips (ZIP)",
+            data=lambda: zip_slips(slips()),
+            file_name=f"Salary_Slips_{header_title.split('- ')[-1]}.zip",
+            mime="application/zip",
+            use_container_width=True
+        )
+
+        recipients = slip_recipients(df_mfs)
+        auditors = excel_df.loc[excel_df['Auditor Name'] != 'GRAND TOTAL', 'Auditor Name']
+        with_address = int(normalize_names(auditors).isin(list(recipients)).sum())
+        st.caption(f"{with_address} of {len(auditors)} auditors have an e-mail address in the MFS data.")
+        if not with_address:
+            return
+
+        with st.form("slip_mail"):
+            smtp_host = st.text_input("SMTP host", os.environ.get('SMTP_HOST', 'localhost'))
+            smtp_port = st.number_input("SMTP port", min_value=1, max_value=65535, value=int(os.environ.get('SMTP_PORT', 25)))
+            sender = st.text_input("Sender", os.environ.get('SMTP_SENDER', ''))
+            # Widget defaults are sent to the browser, so credentials are never pre-filled;
+            # blank fields fall back to SMTP_USER / SMTP_PASSWORD on the server when sending
+            smtp_user = st.text_input("Username", placeholder="SMTP_USER from the server environment")
+            smtp_password = st.text_input("Password", type="password", placeholder="SMTP_PASSWORD from the server environment")
+            starttls = st.checkbox("Use STARTTLS")
+            submitted = st.form_submit_button(f"Send {with_address} salary slips")
+
+        if submitted:
+            progress = st.progress(0.0, text="Sending salary slips...")
+            smtp_user = smtp_user or os.environ.get('SMTP_USER') or None
+            smtp_password = smtp_password or os.environ.get('SMTP_PASSWORD', '')
+            mailer = SlipMailer(smtp_host, int(smtp_port), smtp_user, smtp_password, starttls=starttls)
+            try:
+                result = send_slips(
+                    slips(), recipients, mailer, sender, header_title, header_date_range,
+                    progress=lambda done, total: progress.progress(done / total, text=f"{done}/{total} processed"),
+                )
+            except (smtplib.SMTPException, OSError) as e:
+                st.error(f"Could not connect to the SMTP server: {e}")
+                return
+            st.success(f"Sent {result['sent']} salary slips.")
+            if result['failed']:
+                st.warning("Not delivered: " + ", ".join(f"{name} ({error})" for name, error in result['failed'].items()))
+
+
+def what_if_panel(auditor_performance, col_assigned, unit_price, header_title, header_date_range):
+    # Budgeting sweep: total payouts over a grid of unit prices and fixed/variable
+    # splits, all computed at once from the aggregated counts (Excel rounding)
+    with st.expander("📈 What-If: Unit Price & Fixed/Variable Split"):
+        price_col, share_col = st.columns(2)
+        with price_col:
+            price_from = st.number_input("Unit price from", min_value=0.0, value=1.0, step=0.5)
+            price_to = st.number_input("Unit price to", min_value=0.0, value=float(max(10, unit_price * 2)), step=0.5)
+            price_step = st.number_input("Unit price step", min_value=0.01, value=0.5, step=0.5)
+        with share_col:
+            share_from = st.number_input("Fixed share from (%)", min_value=0, max_value=100, value=50, step=5)
+            share_to = st.number_input("Fixed share to (%)", min_value=0, max_value=100, value=100, step=5)
+            share_step = st.number_input("Fixed share step (%)", min_value=1, max_value=100, value=5, step=1)
+
+        unit_prices = scenario_grid(price_from, price_to, price_step)
+        fixed_shares = scenario_grid(share_from, share_to, share_step) / 100
+        scenarios = len(unit_prices) * len(fixed_shares)
+        if scenarios * max(len(auditor_performance), 1) > MAX_SWEEP_CELLS:
+            st.warning(f"{scenarios:,} scenarios x {len(auditor_performance)} auditors is too large; use coarser steps.")
+            return
+
+        with stage('what_if_sweep', rows=scenarios):
+            sweep = PayrollSweep(auditor_performance, col_assigned, unit_prices, fixed_shares)
+            sensitivity = sweep.sensitivity()
+        st.caption(f"{scenarios:,} scenarios over {len(auditor_performance)} auditors. "
+                   "Totals are sums of per-auditor payouts rounded like the Excel report.")
+
+        st.line_chart(sensitivity, x_label="Unit Price (BDT)", y_label="Total Actual Payable (BDT)")
+        st.dataframe(
+            sensitivity,
+            use_container_width=True,
+            column_config={col: st.column_config.NumberColumn(format="%d") for col in sensitivity.columns},
+        )
+
+        col1, col2 = st.columns(2)
+        for column, fmt, label in ((col1, 'csv', "Download scenarios (CSV)"), (col2, 'xlsx', "Download sensitivity (Excel)")):
+            with column:
+                st.download_button(
+                    label=label,
+                    data=lambda fmt=fmt: render_sweep(sweep, fmt, header_title, header_date_range),
+                    file_name=sweep_filename(header_title, fmt),
+                    mime=SWEEP_FORMATS[fmt][0],
+                    use_container_width=True
+                )
+
+
+def profile_panel(profiler):
+    # Collapsible per-stage timings for this rerun; cached stages do not re-run and are absent
+    with st.sidebar.expander("⏱️ Pipeline Profile"):
+        if not profiler.records:
+            st.caption("No pipeline stage ran on this rerun (everything was cached).")
+            return
+        st.dataframe(
+            profiler.frame(),
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                'seconds': st.column_config.NumberColumn(format="%.3f"),
+                'peak_rss_mb': st.column_config.NumberColumn("peak RSS (MB)", format="%.0f"),
+            },
+        )
+        st.caption(f"Total {profiler.total_seconds():.3f}s. Stages served from cache are not listed.")
+        if st.checkbox("Emit stage timings as JSON logs", value=os.environ.get('PROFILE_JSON') == '1'):
+            enable_json_logs()
+            profiler.log()
+
 
 def main():
+    profiler = StageProfiler(run='app')
+    with profiler:
+        report_page()
+    profile_panel(profiler)
+
+
+def report_page():
     st.set_page_config(layout="wide") # Set page layout to wide for better use of space
     st.title("Auditor Performance and Salary Analysis")
 
@@ -29,200 +294,84 @@ def main():
     
     st.sidebar.markdown("---")
     st.sidebar.markdown("---")
-    audit_file = st.sidebar.file_uploader("Upload Audit Data (CSV or XLSX)", type=["csv", "xlsx"])
-    
-    # Google Sheets MFS Integration
-    SHEET_ID = "1v8w8O-s3wKVfBXeEDU9Sd7F-nmSlQRV39mDs1iZxsSc"
-    SHEET_URL = f"https://docs.google.com/spreadsheets/d/{SHEET_ID}/export?format=csv"
+    audit_files = st.sidebar.file_uploader("Upload Audit Data (CSV or XLSX)", type=["csv", "xlsx"],
+                                           accept_multiple_files=True)
+    stream_ingest = st.sidebar.checkbox("Low-memory mode (large CSV)",
+                                        help="Reads only the mapped columns in chunks. CSV uploads only.")
     
     mfs_file = st.sidebar.file_uploader("Override MFS Data (Optional CSV)", type=["csv"])
     
     # Logic to decide which MFS data to use
+    df_mfs = None
     if mfs_file is not None:
-        mfs_source = mfs_file
-        st.sidebar.success("✅ Using Uploaded MFS Override")
+        try:
+            df_mfs = pd.read_csv(mfs_file, header=2)
+            st.sidebar.success("✅ Using Uploaded MFS Override")
+        except Exception as e:
+            st.sidebar.error(f"Could not read the MFS override: {e}")
     else:
-        mfs_source = SHEET_URL
-        st.sidebar.info("🌐 Connected to Google Sheets MFS Database")
+        try:
+            with stage('mfs_load'):
+                df_mfs, mfs_status = sheet_loader.load()
+            if mfs_status['offline']:
+                st.sidebar.warning("📴 Google Sheets unreachable. Using the last saved MFS snapshot.")
+            else:
+                st.sidebar.info("🌐 Connected to Google Sheets MFS Database")
+            cache_label = "cache hit" if mfs_status['cache_hit'] else "cache miss"
+            st.sidebar.caption(f"Last synced: {mfs_status['last_synced'] or 'never'} ({cache_label}, {mfs_status['source']})")
+        except Exception:
+            df_mfs = None
+
+    # --- Payroll Ledger ---
+    use_ledger = False
+    ledger_start = ledger_end = None
+    with st.sidebar.expander("📒 Payroll Ledger"):
+        ledger_stats = payroll_ledger.stats()
+        st.caption(f"{ledger_stats['visits']:,} visits from {ledger_stats['auditors']} auditors recorded"
+                   + (f" ({ledger_stats['first_date']} to {ledger_stats['last_date']})" if ledger_stats['first_date'] else ""))
+        if ledger_stats['visits']:
+            use_ledger = st.checkbox("Build report from ledger", help="Uses stored per-day counts instead of an upload.")
+        if use_ledger and ledger_stats['first_date']:
+            date_range = st.date_input(
+                "Visit date range", value=(ledger_stats['first_date'], ledger_stats['last_date']),
+                min_value=ledger_stats['first_date'], max_value=ledger_stats['last_date'],
+            )
+            if len(date_range) == 2:
+                ledger_start, ledger_end = date_range
 
-    if audit_file is not None: # MFS is now optional/auto-loaded
+    if audit_files or use_ledger: # MFS is now optional/auto-loaded
         try:
-            # --- Process Audit Data ---
-            if audit_file.name.endswith('.csv'):
-                df_audit = pd.read_csv(audit_file)
-            else: # .xlsx
-                df_audit = pd.read_excel(audit_file)
-
-            # Ensure we have column mapping for flexibility
-            st.sidebar.markdown("---")
-            st.sidebar.subheader("⚙️ Column Mapping")
-            
-            # Suggestion/Help Box
-            with st.sidebar.expander("📘 Definitive Mapping Guide"):
-                st.markdown("""
-                | Target Column | Description | Key Requirement |
-                | :--- | :--- | :--- |
-                | **Auditor Name** | The person who performed the primary audit. | Unique Text/Name |
-                | **Visit ID** | The specific identifier for each site visit. | Unique ID / String |
-                | **Re-Audited** | Whether a second check (re-audit) was done. | True/False or Yes/No |
-                | **Mismatch** | If the re-audit found a discrepancy. | True/False or Yes/No |
-                
-                ---
-                *Note: The app prioritizes `assigned_to`, `visit_id`, `re_audited`, and `mismatch_found_in_reaudit` automatically.*
-                """)
-
-            all_cols = df_audit.columns.tolist()
-            
-            # Auto-detect functions with specific defaults prioritized
-            def find_col(preferred, keywords, default_index=0):
-                if preferred in all_cols:
-                    return preferred
-                for col in all_cols:
-                    if any(k in col.lower() for k in keywords):
-                        return col
-                return all_cols[default_index] if all_cols else None
-
-            # Mapping Selectors with specific defaults
-            col_assigned = st.sidebar.selectbox("Auditor Name Column", all_cols, 
-                                               index=all_cols.index(find_col('assigned_to', ['assign', 'auditor'])))
-            col_visit = st.sidebar.selectbox("Visit ID Column", all_cols, 
-                                            index=all_cols.index(find_col('visit_id', ['visit', 'id'])))
-            col_reaudit = st.sidebar.selectbox("Re-Audited Column", all_cols, 
-                                              index=all_cols.index(find_col('re_audited', ['re_audit', 'reaudited'])))
-            col_mismatch = st.sidebar.selectbox("Mismatch Column", all_cols, 
-                                               index=all_cols.index(find_col('mismatch_found_in_reaudit', ['mismatch', 'found'])))
-
-            # Ensure columns are the right types
-            df_audit[col_reaudit] = df_audit[col_reaudit].astype(bool)
-            df_audit[col_mismatch] = df_audit[col_mismatch].astype(bool)
-
-            # --- Extract Date Info for Header ---
-            # Search for a column with 'date' in its name
-            date_col = next((col for col in df_audit.columns if 'date' in col.lower()), None)
-            header_title = "GP GLM Auditor's Salary"
-            header_date_range = "Visit Date: [Date Not Found]"
-            
-            if date_col:
-                # Attempt to parse dates
-                try:
-                    df_audit[date_col] = pd.to_datetime(df_audit[date_col])
-                    valid_dates = df_audit[date_col].dropna()
-                    if not valid_dates.empty:
-                        start_date = valid_dates.min()
-                        end_date = valid_dates.max()
-                        
-                        # Format: dd-Month-yyyy
-                        start_str = start_date.strftime('%d-%B-%Y')
-                        end_str = end_date.strftime('%d-%B-%Y')
-                        
-                        header_date_range = f"Visit Date: {start_str} to {end_str}"
-                        # Salary month based on end date: e.g., December'2025
-                        header_title = f"GP GLM Auditor's Salary- {end_date.strftime('%B')}'{end_date.year}"
-                except Exception:
-                    pass
-
-            # Group by auditor name for audit performance
-            auditor_performance = df_audit.groupby(col_assigned).apply(lambda group: pd.Series({
-                'audit_visited': group[col_visit].nunique(),
-                're_audit_visited': group[col_reaudit].sum(),
-                'mismatch_found_no_audit': group[group[col_reaudit] == True][col_mismatch].eq(False).sum(),
-                'mismatch_found_yes_audit': group[group[col_reaudit] == True][col_mismatch].eq(True).sum()
-            })).reset_index()
-
-            # Calculate % for logic (keep as float)
-            auditor_performance['mismatch_rate'] = (
-                auditor_performance['mismatch_found_yes_audit'] / auditor_performance['re_audit_visited']
-            ).fillna(0)
-
-            # Performance Calculations
-            auditor_performance['Unit Price'] = unit_price
-            auditor_performance['Max Payable'] = auditor_performance['audit_visited'] * unit_price
-            auditor_performance['Fixed (75%)'] = auditor_performance['Max Payable'] * 0.75
-            auditor_performance['Variable (25%)'] = (auditor_performance['Max Payable'] * 0.25) * (1 - auditor_performance['mismatch_rate'])
-            auditor_performance['Actual Payable'] = auditor_performance['Fixed (75%)'] + auditor_performance['Variable (25%)']
-            
-            # Final Percentage for display
-            auditor_performance['% Mismatch in Re-Audit'] = auditor_performance['mismatch_rate'] * 100
-
-            # Rename columns for display
-            auditor_performance.rename(columns={
-                col_assigned: 'Auditor Name',
-                'audit_visited': 'Audited Visit',
-                're_audit_visited': 'Re-Audited Visit',
-                'mismatch_found_no_audit': 'Mismatch No',
-                'mismatch_found_yes_audit': 'Mismatch Yes'
-            }, inplace=True)
+            if use_ledger:
+                # Report straight from the stored per-day counts, no raw rows needed
+                col_assigned = 'Auditor Name'
+                with stage('ledger_query'):
+                    auditor_performance = payroll_ledger.performance(ledger_start, ledger_end, col_assigned)
+                    header_title, header_date_range = payroll_ledger.date_header(ledger_start, ledger_end)
+            else:
+                auditor_performance, col_assigned, header_title, header_date_range = process_upload(audit_files, stream_ingest)
+
+            with stage('salary', rows=len(auditor_performance)):
+                salary_df = compute_salary(auditor_performance, unit_price, col_assigned)
 
             # --- Process MFS Data ---
-            try:
-                df_mfs = pd.read_csv(mfs_source, header=2)
-            except Exception:
-                # Fallback in case of network issues or format changes
+            if df_mfs is None:
+                # No network and no saved snapshot to fall back to
                 st.error("⚠️ Failed to load MFS Data from Google Sheets. Please upload the file manually.")
                 st.stop()
-            mfs_data = df_mfs[['Auditor Name', 'Full Name', 'MFS Number', 'MFS Provider']].copy()
-            
-            # Ensure MFS Number starts with 0
-            mfs_data['MFS Number'] = mfs_data['MFS Number'].apply(lambda x: f"0{int(x)}" if pd.notnull(x) and not str(x).startswith('0') else str(x))
-
-            # --- Merge Data ---
-            combined_df = pd.merge(
-                auditor_performance,
-                mfs_data,
-                on='Auditor Name',
-                how='left'
-            )
-
-            # Insert 'Sl' column at the beginning
-            combined_df.insert(0, 'Sl', range(1, len(combined_df) + 1))
-
-            # Add Grand Total row
-            numeric_cols = ['Audited Visit', 'Re-Audited Visit', 'Mismatch No', 'Mismatch Yes', 'Max Payable', 'Fixed (75%)', 'Variable (25%)', 'Actual Payable']
-            totals = combined_df[numeric_cols].sum()
-            
-            total_row = pd.DataFrame([{
-                'Auditor Name': 'GRAND TOTAL',
-                **totals.to_dict(),
-                '% Mismatch in Re-Audit': (totals['Mismatch Yes'] / totals['Re-Audited Visit'] * 100) if totals['Re-Audited Visit'] > 0 else 0,
-                'Unit Price': ''
-            }])
-            df_total_row = pd.concat([combined_df, total_row], ignore_index=True)
-
-            # --- Prepare Data for Excel Formulas ---
-            # We keep a copy of the dataframe before string formatting
-            excel_df = df_total_row.copy()
-            
-            # Format columns for Frontend display (using original name combined_df for display logic)
-            combined_df = df_total_row.copy()
-
-            # Format columns for Frontend
-            if '% Mismatch in Re-Audit' in combined_df.columns:
-                combined_df['% Mismatch in Re-Audit'] = combined_df['% Mismatch in Re-Audit'].apply(
-                    lambda x: f"{round(float(x))}%" if pd.notnull(x) and x != '' else ""
-                )
 
-            # Round numeric payment columns to whole numbers for display
-            payment_cols = ['Max Payable', 'Fixed (75%)', 'Variable (25%)', 'Actual Payable']
-            for col in payment_cols:
-                combined_df[col] = combined_df[col].apply(lambda x: round(float(x)) if pd.notnull(x) and x != '' else x)
-
-            cols_to_int = ['Sl', 'Audited Visit', 'Re-Audited Visit', 'Mismatch No', 'Mismatch Yes'] + payment_cols
-            for col in cols_to_int:
-                if col in combined_df.columns:
-                    combined_df[col] = combined_df[col].fillna(0).astype(str).replace(r'\.0$', '', regex=True)
-            
-            combined_df.replace('0', '', inplace=True)
-            combined_df.replace('nan', '', inplace=True)
-            combined_df.loc[combined_df['Auditor Name'] == 'GRAND TOTAL', 'Sl'] = ''
-            combined_df.fillna('', inplace=True)
-
-            # Reorder columns to match image
-            final_cols = [
-                'Sl', 'Auditor Name', 'Audited Visit', 'Re-Audited Visit', 'Mismatch No', 'Mismatch Yes', 
-                '% Mismatch in Re-Audit', 'Unit Price', 'Max Payable', 'Fixed (75%)', 'Variable (25%)', 
-                'Actual Payable', 'Full Name', 'MFS Number', 'MFS Provider'
-            ]
-            combined_df = combined_df[final_cols]
+            # --- Merge Data & Grand Total ---
+            # excel_df keeps the numeric values for the Excel formulas
+            with stage('mfs_merge', rows=len(salary_df)):
+                mfs_index = prepare_mfs(df_mfs)
+                excel_df = build_salary_report(salary_df, mfs_index)
+            unmatched = mfs_index.unmatched(salary_df['Auditor Name'])
+            if unmatched:
+                st.warning(f"⚠️ No MFS payment details for {len(unmatched)} auditor(s): {', '.join(map(str, unmatched))}. "
+                           "Add them (or an alias) to the MFS sheet.")
+            if mfs_index.duplicates:
+                st.sidebar.warning(f"MFS sheet lists these names more than once (first row used): {', '.join(mfs_index.duplicates)}")
+            with stage('format_display', rows=len(excel_df)):
+                combined_df = format_for_display(excel_df)
 
             # Dynamic Header Display
             st.markdown(f"""
@@ -238,165 +387,53 @@ def main():
                 combined_df, 
                 use_container_width=True, 
                 hide_index=True,
-                height=600
+                height=600,
+                column_config=display_column_config()
             )
 
-            # Add download buttons in columns
-            col1, col2 = st.columns(2)
+            # Add download buttons in columns; files are rendered on click and memoized
+            exports = ReportExports(excel_df, header_title, header_date_range, unit_price, csv_df=combined_df)
+            col1, col2, col3, col4 = st.columns(4)
             
             with col1:
-                csv = combined_df.to_csv(index=False).encode('utf-8')
                 st.download_button(
                     label="Download as CSV",
-                    data=csv,
+                    data=exports.renderer('csv'),
                     file_name="combined_auditor_performance.csv",
-                    mime="text/csv",
+                    mime=exports.mime('csv'),
                     use_container_width=True
                 )
             
             with col2:
-                # Excel export logic with high-fidelity styling
-                excel_buffer = io.BytesIO()
-                # Exclude 'Sl' for Excel to match the image
-                export_cols = [
-                    'Auditor Name', 'Audited Visit', 'Re-Audited Visit', 
-                    'Mismatch No', 'Mismatch Yes', '% Mismatch in Re-Audit', 
-                    'Unit Price', 'Max Payable', 'Fixed (75%)', 'Variable (25%)', 
-                    'Actual Payable', 'Full Name', 'MFS Number', 'MFS Provider'
-                ]
-                
-                with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
-                    # Write static data starting from row 5 (Row 1-2: Title, Row 3-4: Headers)
-                    excel_df[export_cols].to_excel(writer, index=False, sheet_name='Salary Report', startrow=4, header=False)
-                    
-                    workbook = writer.book
-                    worksheet = writer.sheets['Salary Report']
-                    
-                    from openpyxl.styles import Alignment, Font, PatternFill, Border, Side
-                    
-                    # --- Color and Style Definitions ---
-                    blue_fill = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
-                    yellow_fill = PatternFill(start_color='FFF2CC', end_color='FFF2CC', fill_type='solid')
-                    white_font = Font(color='FFFFFF', bold=True, size=12)
-                    black_bold_font = Font(bold=True)
-                    center_aligned = Alignment(horizontal='center', vertical='center', wrap_text=True)
-                    thin_border = Border(
-                        left=Side(style='thin'), right=Side(style='thin'), 
-                        top=Side(style='thin'), bottom=Side(style='thin')
-                    )
-
-                    # --- 1. Main Headers (Rows 1 & 2) ---
-                    worksheet.merge_cells(start_row=1, start_column=1, end_row=1, end_column=len(export_cols))
-                    worksheet.merge_cells(start_row=2, start_column=1, end_row=2, end_column=len(export_cols))
-                    
-                    row1 = worksheet.cell(row=1, column=1, value=header_title)
-                    row2 = worksheet.cell(row=2, column=1, value=f"[{header_date_range}]")
-                    
-                    for r in [1, 2]:
-                        for c in range(1, len(export_cols) + 1):
-                            cell = worksheet.cell(row=r, column=c)
-                            cell.fill = blue_fill
-                            cell.font = white_font
-                            cell.alignment = center_aligned
-
-                    # --- 2. Table Headers (Rows 3 & 4) ---
-                    # Columns: A(Auditor), B(Audited), C(ReAudited), D-F(Mismatch), G(Unit), H(Max), I(Fixed), J(Variable), K(Actual), L(Full), M(MFS), N(Provider)
-                    
-                    headers = [
-                        (3, 1, 4, 1, "Auditor Name"),
-                        (3, 2, 4, 2, "Audited Visit"),
-                        (3, 3, 4, 3, "Re-Audited\nVisit"),
-                        (3, 4, 3, 6, "Mismatch found"), # Parent for No, Yes, %
-                        (4, 4, 4, 4, "No"),
-                        (4, 5, 4, 5, "Yes"),
-                        (4, 6, 4, 6, "%"),
-                        (3, 7, 4, 7, "Unit Price"),
-                        (3, 8, 4, 8, "Max Payable"),
-                        (3, 9, 3, 9, "Fixed"),
-                        (4, 9, 4, 9, "75%"),
-                        (3, 10, 3, 10, "Variable"),
-                        (4, 10, 4, 10, "25%"),
-                        (3, 11, 4, 11, "Actual\nPayable"),
-                        (3, 12, 4, 12, "Full Name"),
-                        (3, 13, 4, 13, "MFS Number"),
-                        (3, 14, 4, 14, "MFS Provider"),
-                    ]
-
-                    for s_row, s_col, e_row, e_col, val in headers:
-                        if s_row != e_row or s_col != e_col:
-                            worksheet.merge_cells(start_row=s_row, start_column=s_col, end_row=e_row, end_column=e_col)
-                        cell = worksheet.cell(row=s_row, column=s_col, value=val)
-                        cell.font = black_bold_font
-                        cell.alignment = center_aligned
-                        # Apply borders to all cells in the header area
-                        for r in range(s_row, e_row + 1):
-                            for c in range(s_col, e_col + 1):
-                                worksheet.cell(row=r, column=c).border = thin_border
-
-                    # --- 3. Data Rows & Formulas ---
-                    num_auditors = len(excel_df) - 1
-                    data_start_row = 5
-                    
-                    for i in range(num_auditors + 1): # +1 to include Grand Total row
-                        row_idx = data_start_row + i
-                        is_total = (i == num_auditors)
-                        
-                        # Apply borders and alignment to row
-                        for col_idx in range(1, len(export_cols) + 1):
-                            cell = worksheet.cell(row=row_idx, column=col_idx)
-                            cell.border = thin_border
-                            cell.alignment = center_aligned if col_idx > 1 else Alignment(horizontal='left')
-                            
-                            # Actual Payable Column (K / 11) gets yellow background
-                            if col_idx == 11:
-                                cell.fill = yellow_fill
-                                cell.font = black_bold_font
-
-                        if not is_total:
-                            # Formulas for auditor rows
-                            # Column mapping: B=Audited, C=Re-Audited, D=Mismatch No, E=Mismatch Yes, F=% Mismatch, G=Unit Price, H=Max, I=Fixed, J=Variable, K=Actual
-                            
-                            # % Mismatch (E/C): worksheet.cell(row=row_idx, column=6).value
-                            # Corrected denominator to column C (Re-Audited Visit)
-                            worksheet.cell(row=row_idx, column=6).value = f"=IF(C{row_idx}=0, 0, E{row_idx}/C{row_idx})"
-                            worksheet.cell(row=row_idx, column=6).number_format = '0.00%'
-                            
-                            # Max Payable (B*G) - Rounded to 0
-                            worksheet.cell(row=row_idx, column=8).value = f"=ROUND(B{row_idx}*G{row_idx}, 0)"
-                            # Fixed (H*0.75) - Rounded to 0
-                            worksheet.cell(row=row_idx, column=9).value = f"=ROUND(H{row_idx}*0.75, 0)"
-                            # Variable ((H*0.25)*(1-F)) - Rounded to 0
-                            worksheet.cell(row=row_idx, column=10).value = f"=ROUND((H{row_idx}*0.25)*(1-F{row_idx}), 0)"
-                            # Actual (I+J)
-                            worksheet.cell(row=row_idx, column=11).value = f"=I{row_idx}+J{row_idx}"
-                            
-                            # Apply number format to payment columns
-                            for pay_col in [8, 9, 10, 11]:
-                                worksheet.cell(row=row_idx, column=pay_col).number_format = '#,##0'
-                        else:
-                            # Grand Total formula row
-                            for col_letter in ['B', 'C', 'D', 'E', 'H', 'I', 'J', 'K']:
-                                worksheet[f"{col_letter}{row_idx}"] = f"=SUM({col_letter}{data_start_row}:{col_letter}{row_idx - 1})"
-                                if col_letter in ['H', 'I', 'J', 'K']:
-                                    worksheet[f"{col_letter}{row_idx}"].number_format = '#,##0'
-                            
-                            # Total %: =IF(C=0, 0, E/C) - Corrected denominator to C
-                            worksheet[f"F{row_idx}"] = f"=IF(C{row_idx}=0, 0, E{row_idx}/C{row_idx})"
-                            worksheet[f"F{row_idx}"].number_format = '0.00%'
-
-                    # Set column widths for better visibility
-                    column_widths = [25, 12, 12, 8, 8, 10, 10, 12, 10, 10, 12, 25, 15, 15]
-                    for i, width in enumerate(column_widths):
-                        worksheet.column_dimensions[chr(65 + i)].width = width
-
                 st.download_button(
                     label="Download as Excel with Formulas",
-                    data=excel_buffer.getvalue(),
-                    file_name=f"Salary_Report_{header_title.split('- ')[-1]}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    data=exports.renderer('xlsx'),
+                    file_name=exports.filename('xlsx'),
+                    mime=exports.mime('xlsx'),
+                    use_container_width=True
+                )
+
+            with col3:
+                st.download_button(
+                    label="Download Payroll (Parquet)",
+                    data=exports.renderer('parquet'),
+                    file_name=exports.filename('parquet'),
+                    mime=exports.mime('parquet'),
+                    use_container_width=True
+                )
+
+            with col4:
+                st.download_button(
+                    label="Download Payroll (JSON)",
+                    data=exports.renderer('json'),
+                    file_name=exports.filename('json'),
+                    mime=exports.mime('json'),
                     use_container_width=True
                 )
 
+            salary_slip_panel(excel_df, header_title, header_date_range, df_mfs)
+            what_if_panel(auditor_performance, col_assigned, unit_price, header_title, header_date_range)
+
         except Exception as e:
             st.error(f"An error occurred during file processing: {e}")
     else:
@@ -0,0 +1,797 @@
+import argparse
+import collections
+import http.server
+import io
+import json
+import multiprocessing
+import os
+import resource
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+import openpyxl
+import pandas as pd
+from openpyxl.styles import Alignment, Font, PatternFill, Border, Side
+
+from engine import (
+    aggregate_auditor_performance, compact_audit_frame, extract_date_header, frame_memory_mb, generate_report,
+    parse_bool, visit_keys,
+)
+from cube import NO_REGION, AuditCube
+from export import EXPORT_COLUMNS, ReportExports, write_excel_report
+from ingest import (
+    STREAM_CHUNK_ROWS, combine_audit_frames, load_audit_frames, load_combined_audit, read_audit_file, stream_audit_csv,
+)
+from ledger import PayrollLedger
+from profiling import StageProfiler, stage
+from scenarios import PayrollSweep, scenario_grid
+
+AUDIT_MAPPING = ('assigned_to', 'visit_id', 're_audited', 'mismatch_found_in_reaudit')
+
+
+# --- Synthetic Audit Data ---
+def make_audit_frame(rows, auditors=200, reaudit_ratio=0.3, mismatch_ratio=0.2, days=31, seed=0):
+    rng = np.random.default_rng(seed)
+    names = np.array([f"Auditor {i:04d}" for i in range(auditors)])
+    start = pd.Timestamp('2025-12-01')
+    re_audited = rng.random(rows) < reaudit_ratio
+    return pd.DataFrame({
+        'assigned_to': names[rng.integers(0, auditors, rows)],
+        # Roughly 10% duplicate visit ids so nunique has work to do
+        'visit_id': rng.integers(0, max(int(rows * 0.9), 1), rows),
+        're_audited': re_audited,
+        'mismatch_found_in_reaudit': re_audited & (rng.random(rows) < mismatch_ratio),
+        'visit_date': start + pd.to_timedelta(rng.integers(0, days, rows), unit='D'),
+    })
+
+
+# --- Reference Implementation (pre-engine app.py) ---
+def legacy_auditor_performance(df_audit, col_assigned, col_visit, col_reaudit, col_mismatch):
+    auditor_performance = df_audit.groupby(col_assigned).apply(lambda group: pd.Series({
+        'audit_visited': group[col_visit].nunique(),
+        're_audit_visited': group[col_reaudit].sum(),
+        'mismatch_found_no_audit': group[group[col_reaudit] == True][col_mismatch].eq(False).sum(),
+        'mismatch_found_yes_audit': group[group[col_reaudit] == True][col_mismatch].eq(True).sum()
+    })).reset_index()
+    auditor_performance['mismatch_rate'] = (
+        auditor_performance['mismatch_found_yes_audit'] / auditor_performance['re_audit_visited']
+    ).fillna(0)
+    return auditor_performance
+
+
+# --- Reference Implementation (per-cell openpyxl writer, pre write-only export) ---
+def legacy_excel_report(excel_df, header_title, header_date_range):
+    excel_buffer = io.BytesIO()
+    export_cols = EXPORT_COLUMNS
+
+    with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
+        # Write static data starting from row 5 (Row 1-2: Title, Row 3-4: Headers)
+        excel_df[export_cols].to_excel(writer, index=False, sheet_name='Salary Report', startrow=4, header=False)
+
+        worksheet = writer.sheets['Salary Report']
+
+        # --- Color and Style Definitions ---
+        blue_fill = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
+        yellow_fill = PatternFill(start_color='FFF2CC', end_color='FFF2CC', fill_type='solid')
+        white_font = Font(color='FFFFFF', bold=True, size=12)
+        black_bold_font = Font(bold=True)
+        center_aligned = Alignment(horizontal='center', vertical='center', wrap_text=True)
+        thin_border = Border(
+            left=Side(style='thin'), right=Side(style='thin'),
+            top=Side(style='thin'), bottom=Side(style='thin')
+        )
+
+        # --- 1. Main Headers (Rows 1 & 2) ---
+        worksheet.merge_cells(start_row=1, start_column=1, end_row=1, end_column=len(export_cols))
+        worksheet.merge_cells(start_row=2, start_column=1, end_row=2, end_column=len(export_cols))
+
+        row1 = worksheet.cell(row=1, column=1, value=header_title)
+        row2 = worksheet.cell(row=2, column=1, value=f"[{header_date_range}]")
+
+        for r in [1, 2]:
+            for c in range(1, len(export_cols) + 1):
+                cell = worksheet.cell(row=r, column=c)
+                cell.fill = blue_fill
+                cell.font = white_font
+                cell.alignment = center_aligned
+
+        # --- 2. Table Headers (Rows 3 & 4) ---
+        # Columns: A(Auditor), B(Audited), C(ReAudited), D-F(Mismatch), G(Unit), H(Max), I(Fixed), J(Variable), K(Actual), L(Full), M(MFS), N(Provider)
+
+        headers = [
+            (3, 1, 4, 1, "Auditor Name"),
+            (3, 2, 4, 2, "Audited Visit"),
+            (3, 3, 4, 3, "Re-Audited\nVisit"),
+            (3, 4, 3, 6, "Mismatch found"), # Parent for No, Yes, %
+            (4, 4, 4, 4, "No"),
+            (4, 5, 4, 5, "Yes"),
+            (4, 6, 4, 6, "%"),
+            (3, 7, 4, 7, "Unit Price"),
+            (3, 8, 4, 8, "Max Payable"),
+            (3, 9, 3, 9, "Fixed"),
+            (4, 9, 4, 9, "75%"),
+            (3, 10, 3, 10, "Variable"),
+            (4, 10, 4, 10, "25%"),
+            (3, 11, 4, 11, "Actual\nPayable"),
+            (3, 12, 4, 12, "Full Name"),
+            (3, 13, 4, 13, "MFS Number"),
+            (3, 14, 4, 14, "MFS Provider"),
+        ]
+
+        for s_row, s_col, e_row, e_col, val in headers:
+            if s_row != e_row or s_col != e_col:
+                worksheet.merge_cells(start_row=s_row, start_column=s_col, end_row=e_row, end_column=e_col)
+            cell = worksheet.cell(row=s_row, column=s_col, value=val)
+            cell.font = black_bold_font
+            cell.alignment = center_aligned
+            # Apply borders to all cells in the header area
+            for r in range(s_row, e_row + 1):
+                for c in range(s_col, e_col + 1):
+                    worksheet.cell(row=r, column=c).border = thin_border
+
+        # --- 3. Data Rows & Formulas ---
+        num_auditors = len(excel_df) - 1
+        data_start_row = 5
+
+        for i in range(num_auditors + 1): # +1 to include Grand Total row
+            row_idx = data_start_row + i
+            is_total = (i == num_auditors)
+
+            # Apply borders and alignment to row
+            for col_idx in range(1, len(export_cols) + 1):
+                cell = worksheet.cell(row=row_idx, column=col_idx)
+                cell.border = thin_border
+                cell.alignment = center_aligned if col_idx > 1 else Alignment(horizontal='left')
+
+                # Actual Payable Column (K / 11) gets yellow background
+                if col_idx == 11:
+                    cell.fill = yellow_fill
+                    cell.font = black_bold_font
+
+            if not is_total:
+                # Formulas for auditor rows
+                # Column mapping: B=Audited, C=Re-Audited, D=Mismatch No, E=Mismatch Yes, F=% Mismatch, G=Unit Price, H=Max, I=Fixed, J=Variable, K=Actual
+
+                # % Mismatch (E/C): worksheet.cell(row=row_idx, column=6).value
+                # Corrected denominator to column C (Re-Audited Visit)
+                worksheet.cell(row=row_idx, column=6).value = f"=IF(C{row_idx}=0, 0, E{row_idx}/C{row_idx})"
+                worksheet.cell(row=row_idx, column=6).number_format = '0.00%'
+
+                # Max Payable (B*G) - Rounded to 0
+                worksheet.cell(row=row_idx, column=8).value = f"=ROUND(B{row_idx}*G{row_idx}, 0)"
+                # Fixed (H*0.75) - Rounded to 0
+                worksheet.cell(row=row_idx, column=9).value = f"=ROUND(H{row_idx}*0.75, 0)"
+                # Variable ((H*0.25)*(1-F)) - Rounded to 0
+                worksheet.cell(row=row_idx, column=10).value = f"=ROUND((H{row_idx}*0.25)*(1-F{row_idx}), 0)"
+                # Actual (I+J)
+                worksheet.cell(row=row_idx, column=11).value = f"=I{row_idx}+J{row_idx}"
+
+                # Apply number format to payment columns
+                for pay_col in [8, 9, 10, 11]:
+                    worksheet.cell(row=row_idx, column=pay_col).number_format = '#,##0'
+            else:
+                # Grand Total formula row
+                for col_letter in ['B', 'C', 'D', 'E', 'H', 'I', 'J', 'K']:
+                    worksheet[f"{col_letter}{row_idx}"] = f"=SUM({col_letter}{data_start_row}:{col_letter}{row_idx - 1})"
+                    if col_letter in ['H', 'I', 'J', 'K']:
+                        worksheet[f"{col_letter}{row_idx}"].number_format = '#,##0'
+
+                # Total %: =IF(C=0, 0, E/C) - Corrected denominator to C
+                worksheet[f"F{row_idx}"] = f"=IF(C{row_idx}=0, 0, E{row_idx}/C{row_idx})"
+                worksheet[f"F{row_idx}"].number_format = '0.00%'
+
+        # Set column widths for better visibility
+        column_widths = [25, 12, 12, 8, 8, 10, 10, 12, 10, 10, 12, 25, 15, 15]
+        for i, width in enumerate(column_widths):
+            worksheet.column_dimensions[chr(65 + i)].width = width
+
+    return excel_buffer.getvalue()
+
+
+def timed(fn, *args, repeat=3):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def bench_aggregation(sizes, generator, repeat):
+    cols = AUDIT_MAPPING
+    print(f"{'rows':>12} {'legacy (s)':>12} {'engine (s)':>12} {'speedup':>8}")
+    for rows in sizes:
+        df = make_audit_frame(rows, **generator)
+        legacy_time, expected = timed(legacy_auditor_performance, df, *cols, repeat=repeat)
+        engine_time, actual = timed(aggregate_auditor_performance, df, *cols, repeat=repeat)
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+        print(f"{rows:>12,} {legacy_time:>12.4f} {engine_time:>12.4f} {legacy_time / engine_time:>7.1f}x")
+
+
+# --- Typed Frame Memory ---
+# Spellings seen in exports and what they must parse to (blank / missing is False)
+FLAG_SPELLINGS = [
+    ('Yes', True), ('yes', True), ('Y', True), ('TRUE', True), ('True', True), ('1', True), (1, True), (True, True),
+    ('No', False), ('no', False), ('N', False), ('FALSE', False), ('False', False), ('0', False), (0, False),
+    (False, False), ('', False), (' ', False), (None, False), (np.nan, False),
+]
+
+
+def check_flag_parsing():
+    values, expected = zip(*FLAG_SPELLINGS)
+    actual = parse_bool(pd.Series(list(values), dtype=object))
+    wrong = [(value, bool(got)) for value, got, want in zip(values, actual, expected) if bool(got) != want]
+    assert not wrong, f"parse_bool misread: {wrong}"
+
+
+def bench_schema(sizes, generator, repeat):
+    # Exports carry Yes/No text flags; the legacy astype(bool) read every one as True.
+    # The expected counts come from the generator's real bools, before the flags become text.
+    check_flag_parsing()
+    cols = AUDIT_MAPPING
+    print(f"{'rows':>12} {'raw MB':>8} {'compact MB':>11} {'compact (s)':>12} {'agg bool (s)':>13} {'agg compact (s)':>16}")
+    for rows in sizes:
+        df = make_audit_frame(rows, **generator)
+        raw_time, expected = timed(aggregate_auditor_performance, df, *cols, repeat=repeat)
+        df = df.assign(**{col: np.where(df[col], 'Yes', 'No') for col in cols[2:]})
+        df[cols[0]] = df[cols[0]].astype(object)
+        compact_time, compact = timed(compact_audit_frame, df, *cols, repeat=repeat)
+        agg_time, actual = timed(aggregate_auditor_performance, compact, *cols, repeat=repeat)
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+        print(f"{rows:>12,} {frame_memory_mb(df):>8.1f} {frame_memory_mb(compact):>11.1f} {compact_time:>12.3f}"
+              f" {raw_time:>13.3f} {agg_time:>16.3f}")
+
+
+# --- Date/Region Cube ---
+def make_regional_frame(rows, generator):
+    # Typed audit frame with a region column and ~2% missing dates, regions, visit ids and auditors
+    df = make_audit_frame(rows, **generator)
+    rng = np.random.default_rng(generator['seed'] + 1)
+    df['region'] = np.array(['Dhaka', 'Chattogram', 'Khulna', 'Sylhet'])[rng.integers(0, 4, rows)]
+    for col in ('region', 'visit_date', 'visit_id', 'assigned_to'):
+        df[col] = df[col].astype('Int64' if col == 'visit_id' else df[col].dtype).mask(rng.random(rows) < 0.02)
+    df = compact_audit_frame(df, *AUDIT_MAPPING)
+    return extract_date_header(df)[0]
+
+
+def raw_filter(df, start=None, end=None, regions=None):
+    # What the cube filters must equal: the same selection applied to the raw rows
+    keep = pd.Series(True, index=df.index)
+    if start is not None:
+        keep &= df['visit_date'].dt.normalize() >= pd.Timestamp(start)
+    if end is not None:
+        keep &= df['visit_date'].dt.normalize() <= pd.Timestamp(end)
+    if regions is not None:
+        keep &= df['region'].astype('string').fillna(NO_REGION).isin(regions)
+    return df[keep.fillna(False)]
+
+
+def bench_cube(sizes, generator, filters=40):
+    # AuditCube.performance over random date/region filters must equal
+    # aggregating the pre-filtered raw rows
+    rng = np.random.default_rng(generator['seed'])
+    print(f"{'rows':>12} {'build (s)':>10} {'cells':>9} {'filters':>8} {'cube (ms)':>10} {'raw rows (ms)':>14}")
+    for rows in sizes:
+        df = make_regional_frame(rows, generator)
+        build_time, audit_cube = timed(AuditCube, df, AUDIT_MAPPING, 'visit_date', 'region', repeat=1)
+        first, last = audit_cube.days()
+        span = (last - first).days
+        regions = audit_cube.regions()
+
+        cube_time = raw_time = 0.0
+        for i in range(filters):
+            start = first + pd.Timedelta(days=int(rng.integers(0, span + 1))) if rng.random() < 0.7 else None
+            end = (start or first) + pd.Timedelta(days=int(rng.integers(0, span + 1))) if rng.random() < 0.7 else None
+            picked = list(rng.choice(regions, int(rng.integers(1, len(regions) + 1)), replace=False)) if i % 2 else None
+
+            elapsed, actual = timed(audit_cube.performance, AUDIT_MAPPING[0], start, end, picked, repeat=1)
+            cube_time += elapsed
+            elapsed, expected = timed(
+                lambda: aggregate_auditor_performance(raw_filter(df, start, end, picked), *AUDIT_MAPPING), repeat=1
+            )
+            raw_time += elapsed
+            pd.testing.assert_frame_equal(actual, expected, check_dtype=False, check_index_type=False)
+
+            dates = raw_filter(df, start, end, picked)['visit_date'].dropna()
+            assert audit_cube.date_header(start, end, picked) == extract_date_header(dates.to_frame())[1:], (start, end, picked)
+        print(f"{rows:>12,} {build_time:>10.3f} {len(audit_cube.cells):>9,} {filters:>8}"
+              f" {cube_time / filters * 1000:>10.2f} {raw_time / filters * 1000:>14.2f}")
+
+
+# --- Payroll Ledger ---
+def bench_ledger(sizes, generator):
+    # Two overlapping exports, the second with text visit ids, folded into a fresh
+    # ledger: every visit is counted once, and re-ingesting adds nothing
+    cols = AUDIT_MAPPING
+    print(f"{'rows':>12} {'new (1st)':>10} {'new (2nd)':>10} {'known (2nd)':>12} {'ingest (s)':>11}")
+    for rows in sizes:
+        df = make_audit_frame(rows, **generator)
+        df['visit_id'] = df['visit_id'].astype('Int64').mask(np.arange(rows) % 97 == 0)
+        first = df.iloc[:rows * 3 // 5]
+        second = df.iloc[rows * 2 // 5:].assign(visit_id=lambda d: d['visit_id'].astype('string'))
+        typed = [extract_date_header(compact_audit_frame(part, *cols))[0] for part in (first, second)]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            ledger = PayrollLedger(os.path.join(tmp, 'ledger.sqlite'))
+            start = time.perf_counter()
+            results = [ledger.ingest(part, cols, 'visit_date', source=f'part_{i}') for i, part in enumerate(typed)]
+            elapsed = time.perf_counter() - start
+            assert ledger.ingest(typed[1], cols, 'visit_date')['new_visits'] == 0, "re-ingest added visits"
+            actual = ledger.performance(col_assigned=cols[0])
+            header = ledger.date_header()
+
+        # Union of the visits: the second export only adds pairs the first lacks.
+        # Rows without a visit id are never ledgered.
+        keyed = [part.assign(visit_id=visit_keys(part['visit_id'])).dropna(subset=['visit_id']) for part in (first, second)]
+        seen = pd.MultiIndex.from_frame(keyed[0][list(cols[:2])])
+        fresh = ~pd.MultiIndex.from_frame(keyed[1][list(cols[:2])]).isin(seen)
+        union = pd.concat([keyed[0], keyed[1][fresh]], ignore_index=True)
+        expected = aggregate_auditor_performance(union, *cols)
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+        assert header == extract_date_header(union)[1:], header
+        print(f"{rows:>12,} {results[0]['new_visits']:>10,} {results[1]['new_visits']:>10,}"
+              f" {results[1]['known_visits']:>12,} {elapsed:>11.3f}")
+
+
+# --- Multi-File Uploads ---
+class UploadedBytes(io.BytesIO):
+    # Minimal stand-in for Streamlit's UploadedFile
+    def __init__(self, name, data):
+        super().__init__(data)
+        self.name = name
+        self.size = len(data)
+
+
+def split_exports(df, files, overlap=0.1):
+    # Consecutive slices of df, each repeating the head of the next one like
+    # overlapping monthly exports
+    bounds = np.linspace(0, len(df), files + 1).astype(int)
+    extra = int(len(df) / files * overlap)
+    return [df.iloc[bounds[i]:min(bounds[i + 1] + extra, len(df))] for i in range(files)]
+
+
+def bench_multifile(sizes, generator, files, workers, repeat):
+    # Parse time of N overlapping CSV exports, one at a time vs in a thread pool,
+    # against the largest single file; the combined counts must equal one export
+    cols = AUDIT_MAPPING
+    print(f"{'rows':>12} {'files':>6} {'largest (s)':>12} {'serial (s)':>11} {'threaded (s)':>13} {'dropped':>9}")
+    for rows in sizes:
+        df = make_audit_frame(rows, **generator)
+        df['visit_id'] = np.arange(rows)  # one row per visit, so overlap is the only duplication
+        uploads = [UploadedBytes(f'part_{i}.csv', part.to_csv(index=False).encode())
+                   for i, part in enumerate(split_exports(df, files))]
+
+        largest = max(uploads, key=lambda upload: upload.size)
+        largest_time, _ = timed(read_audit_file, largest.name, largest.getvalue(), repeat=repeat)
+        serial_time, _ = timed(load_audit_frames, uploads, 1, repeat=repeat)
+        threaded_time, frames = timed(load_audit_frames, uploads, workers, repeat=repeat)
+
+        # Reruns with the same files and mapping must not parse again, however many files there are
+        with StageProfiler() as profiler:
+            for _ in range(3):
+                load_combined_audit(uploads, *cols[:2])
+        parses = sum(record['stage'] == 'read_files' for record in profiler.records)
+        assert parses <= 1, f"{parses} parse passes for one unchanged upload"
+
+        combined = combine_audit_frames(frames, cols[0], cols[1])
+        pd.testing.assert_frame_equal(
+            aggregate_auditor_performance(combined, *cols), aggregate_auditor_performance(df, *cols), check_dtype=False
+        )
+        dropped = sum(len(frame) for frame in frames) - len(combined)
+        print(f"{rows:>12,} {files:>6} {largest_time:>12.3f} {serial_time:>11.3f} {threaded_time:>13.3f} {dropped:>9,}")
+
+
+# --- Ingest Memory Curve ---
+def write_wide_csv(path, rows, auditors, text_cols=20):
+    # Real exports carry dozens of free-text columns next to the mapped ones
+    df = make_audit_frame(rows, auditors=auditors)
+    for i in range(text_cols):
+        df[f'comment_{i}'] = 'Outlet verified, shelf photo attached, remarks pending'
+    df.to_csv(path, index=False)
+
+
+def in_memory_report(source):
+    # (performance, title, date range) the way the app's in-memory path builds them
+    df = compact_audit_frame(pd.read_csv(source), *AUDIT_MAPPING)
+    df, header_title, header_date_range = extract_date_header(df)
+    return aggregate_auditor_performance(df, *AUDIT_MAPPING), header_title, header_date_range
+
+
+def streamed_report(source, chunksize=STREAM_CHUNK_ROWS):
+    result = stream_audit_csv(source, AUDIT_MAPPING, chunksize)
+    return result['performance'], result['header_title'], result['header_date_range']
+
+
+def assert_same_report(actual, expected):
+    pd.testing.assert_frame_equal(actual[0], expected[0], check_dtype=False)
+    assert actual[1:] == expected[1:], f"header {actual[1:]} != {expected[1:]}"
+
+
+def check_streaming_parity(rows=20_000, chunksize=1_000):
+    # Many small chunks over messy rows: missing auditors, visit ids, flags and dates
+    df = make_audit_frame(rows, auditors=50)
+    rng = np.random.default_rng(1)
+    df['visit_id'] = df['visit_id'].astype('Int64').mask(rng.random(rows) < 0.02)
+    df['assigned_to'] = df['assigned_to'].mask(rng.random(rows) < 0.02)
+    df['re_audited'] = np.where(df['re_audited'], 'Yes', 'No')
+    df['re_audited'] = df['re_audited'].mask(rng.random(rows) < 0.02, '')
+    df['mismatch_found_in_reaudit'] = df['mismatch_found_in_reaudit'].astype(object).mask(rng.random(rows) < 0.02)
+    df['visit_date'] = df['visit_date'].mask(rng.random(rows) < 0.02)
+    data = df.to_csv(index=False).encode()
+    assert_same_report(streamed_report(io.BytesIO(data), chunksize), in_memory_report(io.BytesIO(data)))
+
+
+def _run_ingest(mode, path, queue):
+    start = time.perf_counter()
+    report = in_memory_report(path) if mode == 'in-memory' else streamed_report(path)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is KiB on Linux
+    queue.put((elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, report))
+
+
+def measure_ingest(mode, path):
+    # Fresh interpreter per run so peak RSS is not polluted by earlier runs
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_run_ingest, args=(mode, path, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def _in_child(target, *args):
+    # Linux keeps ru_maxrss across exec, so the parent must never hold the big frame
+    proc = multiprocessing.get_context('spawn').Process(target=target, args=args)
+    proc.start()
+    proc.join()
+
+
+def bench_streaming(sizes, auditors):
+    # Streaming must produce the same report as the in-memory path
+    check_streaming_parity()
+    print(f"{'rows':>12} {'file (MB)':>10} {'mode':>10} {'time (s)':>10} {'peak RSS (MB)':>14}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in sizes:
+            path = os.path.join(tmp, f'audit_{rows}.csv')
+            _in_child(write_wide_csv, path, rows, auditors)
+            size_mb = os.path.getsize(path) / 2**20
+            reports = {}
+            for mode in ('in-memory', 'streaming'):
+                elapsed, peak, reports[mode] = measure_ingest(mode, path)
+                print(f"{rows:>12,} {size_mb:>10.1f} {mode:>10} {elapsed:>10.2f} {peak:>14.1f}")
+            assert_same_report(reports['streaming'], reports['in-memory'])
+            os.remove(path)
+
+
+# --- Excel Export ---
+def make_report_frame(auditors):
+    # Report-shaped frame (with Grand Total row) without going through the MFS sheet
+    df = make_audit_frame(auditors * 50, auditors=auditors)
+    perf = aggregate_auditor_performance(df, *AUDIT_MAPPING)
+    from engine import build_salary_report, compute_salary, prepare_mfs
+    salary_df = compute_salary(perf, 3, AUDIT_MAPPING[0])
+    mfs_data = pd.DataFrame({
+        'Auditor Name': salary_df['Auditor Name'],
+        'Full Name': salary_df['Auditor Name'] + ' Full',
+        'MFS Number': '01700000000',
+        'MFS Provider': 'bKash',
+    }).iloc[::2]
+    return build_salary_report(salary_df, prepare_mfs(mfs_data))
+
+
+def cell_signature(cell):
+    # Rendered look of a cell; Side(style=None) and a missing side compare equal
+    def side(s):
+        return (s.style, s.color.rgb if s.color else None) if s is not None and s.style else None
+
+    font, fill, border, align = cell.font, cell.fill, cell.border, cell.alignment
+    return (
+        cell.value, cell.number_format,
+        (font.b, font.i, font.sz, font.name, font.color.rgb if font.color else None),
+        (fill.fill_type, fill.fgColor.rgb, fill.bgColor.rgb),
+        tuple(side(s) for s in (border.left, border.right, border.top, border.bottom)),
+        (align.horizontal, align.vertical, align.wrap_text),
+    )
+
+
+def workbook_differences(expected_bytes, actual_bytes, limit=10):
+    # Cell-for-cell comparison of what a reader sees: values, formats, styles,
+    # merged ranges and column widths (named-style names are deliberately ignored)
+    expected = openpyxl.load_workbook(io.BytesIO(expected_bytes))['Salary Report']
+    actual = openpyxl.load_workbook(io.BytesIO(actual_bytes))['Salary Report']
+    diffs = []
+    if set(map(str, expected.merged_cells.ranges)) != set(map(str, actual.merged_cells.ranges)):
+        diffs.append('merged ranges differ')
+    for col, dim in expected.column_dimensions.items():
+        if dim.width != actual.column_dimensions[col].width:
+            diffs.append(f'width of column {col} differs')
+    if (expected.max_row, expected.max_column) != (actual.max_row, actual.max_column):
+        diffs.append('sheet dimensions differ')
+    for exp_row, act_row in zip(expected.iter_rows(), actual.iter_rows()):
+        for e, a in zip(exp_row, act_row):
+            if cell_signature(e) != cell_signature(a):
+                diffs.append(f'{e.coordinate}: {cell_signature(e)} != {cell_signature(a)}')
+    return diffs[:limit]
+
+
+def traced_peak(fn, *args):
+    # Peak Python heap (MB) of one call
+    tracemalloc.start()
+    try:
+        fn(*args)
+        return tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+
+def bench_excel(auditor_counts, repeat):
+    print(f"{'rows':>12} {'legacy (s)':>12} {'write-only (s)':>15} {'speedup':>8} {'legacy MB':>10} {'write-only MB':>14}")
+    for auditors in auditor_counts:
+        report_df = make_report_frame(auditors)
+        args = (report_df, "GP GLM Auditor's Salary- December'2025", "Visit Date: 01-December-2025 to 31-December-2025")
+        legacy_time, expected = timed(legacy_excel_report, *args, repeat=repeat)
+        fast_time, actual = timed(write_excel_report, *args, repeat=repeat)
+        diffs = workbook_differences(expected, actual)
+        assert not diffs, diffs
+        legacy_mb = traced_peak(legacy_excel_report, *args)
+        fast_mb = traced_peak(write_excel_report, *args)
+        print(f"{len(report_df):>12,} {legacy_time:>12.3f} {fast_time:>15.3f} {legacy_time / fast_time:>7.1f}x"
+              f" {legacy_mb:>10.1f} {fast_mb:>14.1f}")
+
+
+# --- Salary Slips ---
+class _SinkHandler:
+    # Local SMTP stand-in: accepts and counts every message
+    def __init__(self):
+        self.received = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        return '250 OK'
+
+
+def bench_slips(auditor_counts, workers, smtp_port):
+    # Needs aiosmtpd (pip install aiosmtpd) for the SMTP stand-in
+    from aiosmtpd.controller import Controller
+    from slips import SlipMailer, render_slips, send_slips, slip_recipients, zip_slips
+
+    handler = _SinkHandler()
+    controller = Controller(handler, hostname='127.0.0.1', port=smtp_port)
+    controller.start()
+    title, date_range = "GP GLM Auditor's Salary- December'2025", "Visit Date: 01-December-2025 to 31-December-2025"
+    print(f"{'auditors':>10} {'serial (s)':>11} {f'pool x{workers} (s)':>14} {'zip (s)':>8} {'send (s)':>9} {'msgs/s':>8} {'conns':>6}")
+    try:
+        for auditors in auditor_counts:
+            report_df = make_report_frame(auditors)
+            serial_time, slips = timed(render_slips, report_df, title, date_range, 1, repeat=1)
+            pool_time, pooled = timed(render_slips, report_df, title, date_range, workers, repeat=1)
+            assert [slip[:2] for slip in slips] == [slip[:2] for slip in pooled]
+            zip_time, _ = timed(zip_slips, pooled, repeat=1)
+
+            names = [auditor for auditor, _, _ in slips]
+            recipients = slip_recipients(pd.DataFrame({
+                'Auditor Name': names, 'Email': [f"auditor{i}@example.com" for i in range(len(names))],
+            }))
+            mailer = SlipMailer('127.0.0.1', smtp_port)
+            received = handler.received
+            send_time, result = timed(send_slips, slips, recipients, mailer, 'audit-team@example.com', title, date_range, repeat=1)
+            assert result['sent'] == len(slips) == handler.received - received, result['failed']
+            print(f"{len(slips):>10,} {serial_time:>11.2f} {pool_time:>14.2f} {zip_time:>8.3f} {send_time:>9.2f}"
+                  f" {len(slips) / send_time:>8.0f} {mailer.connections:>6}")
+    finally:
+        controller.stop()
+
+
+# --- MFS Sheet Loader ---
+class _SheetHandler(http.server.BaseHTTPRequestHandler):
+    # Stand-in for the Google Sheets CSV export: ETag/304 aware, can be taken "down"
+    sheet = {'content': b'', 'etag': '"v0"', 'down': False}
+    hits = collections.Counter()
+
+    def do_GET(self):
+        if self.sheet['down']:
+            self.hits[503] += 1
+            self.send_error(503)
+            return
+        if self.headers.get('If-None-Match') == self.sheet['etag']:
+            self.hits[304] += 1
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.hits[200] += 1
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/csv')
+        self.send_header('ETag', self.sheet['etag'])
+        self.send_header('Content-Length', str(len(self.sheet['content'])))
+        self.end_headers()
+        self.wfile.write(self.sheet['content'])
+
+    def log_message(self, *args):
+        pass
+
+
+def sheet_csv(auditors):
+    # The real export has two banner rows above the header
+    return b"MFS,,,\nGP Auditors,,,\n" + make_mfs_frame(auditors).to_csv(index=False).encode()
+
+
+def bench_mfs(auditor_counts):
+    # MFSLoader against a local HTTP server: cold fetch, memory hit, 304
+    # revalidation, changed sheet, then a restart with the sheet offline
+    from mfs import MFSLoader
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _SheetHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/export?format=csv"
+    sheet, hits = _SheetHandler.sheet, _SheetHandler.hits
+    print(f"{'auditors':>9} {'cold (ms)':>10} {'memory (ms)':>12} {'304 (ms)':>9} {'offline start (ms)':>19}")
+    try:
+        for auditors in auditor_counts:
+            sheet.update(content=sheet_csv(auditors), etag=f'"{auditors}-v1"', down=False)
+            hits.clear()
+            with tempfile.TemporaryDirectory() as cache_dir:
+                loader = MFSLoader(url, cache_dir=cache_dir, ttl=3600)
+                cold_time, (df, status) = timed(loader.load, repeat=1)
+                assert status['source'] == 'network' and not status['cache_hit'] and len(df) == len(range(0, auditors, 2))
+                memory_time, (_, status) = timed(loader.load, repeat=1)
+                assert status['source'] == 'memory' and status['cache_hit'] and hits[200] == 1
+
+                not_modified_time, changed = timed(loader.refresh, repeat=1)
+                assert not changed and hits[304] == 1, hits
+
+                sheet.update(content=sheet_csv(auditors + 2), etag=f'"{auditors}-v2"')
+                assert loader.refresh() and len(loader.load()[0]) == len(range(0, auditors + 2, 2))
+
+                # Fresh process, sheet unreachable: the disk snapshot is served and flagged offline
+                sheet['down'] = True
+                restarted = MFSLoader(url, cache_dir=cache_dir, ttl=3600)
+                offline_time, (df, status) = timed(restarted.load, repeat=1)
+                assert status['source'] == 'disk' and len(df) == len(range(0, auditors + 2, 2)), status
+                assert not restarted.refresh() and restarted.load()[1]['offline']
+            print(f"{auditors:>9,} {cold_time * 1000:>10.2f} {memory_time * 1000:>12.3f} {not_modified_time * 1000:>9.2f}"
+                  f" {offline_time * 1000:>19.2f}")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+# --- What-If Sweep ---
+def bench_sweep(auditor_counts, scenario_counts, repeat):
+    # One broadcast pass over the aggregated counts per grid; every scenario at
+    # the report's split must match payroll_frame (the Excel formulas) exactly
+    from engine import FIXED_SHARE, payroll_frame
+    print(f"{'auditors':>9} {'scenarios':>10} {'sweep (s)':>10} {'totals (s)':>11} {'per scenario (us)':>18}")
+    for auditors in auditor_counts:
+        report_df = make_report_frame(auditors)
+        auditor_performance = aggregate_auditor_performance(make_audit_frame(auditors * 50, auditors=auditors), *AUDIT_MAPPING)
+        for scenarios in scenario_counts:
+            # ~1/20 of the grid is split ratios (0.5..1.0), the rest unit prices in 0.25 steps
+            fixed_shares = scenario_grid(0.5, 1.0, 0.025)
+            unit_prices = scenario_grid(0.25, 0.25 * max(scenarios // len(fixed_shares), 1), 0.25)
+            sweep_time, sweep = timed(PayrollSweep, auditor_performance, AUDIT_MAPPING[0], unit_prices, fixed_shares,
+                                      repeat=repeat)
+            totals_time, _ = timed(sweep.totals, repeat=repeat)
+
+            for price in unit_prices[::max(len(unit_prices) // 5, 1)]:
+                expected = payroll_frame(report_df.assign(**{'Unit Price': price}))
+                actual = sweep.auditor_payouts(price, FIXED_SHARE)
+                np.testing.assert_array_equal(actual['actual_payable'].to_numpy(), expected['actual_payable'].to_numpy())
+            print(f"{auditors:>9,} {sweep.scenarios:>10,} {sweep_time:>10.4f} {totals_time:>11.4f}"
+                  f" {sweep_time / sweep.scenarios * 1e6:>18.2f}")
+
+
+# --- Pipeline Stages ---
+def make_mfs_frame(auditors):
+    # MFS sheet for the synthetic auditors (every other one has payment details)
+    names = [f"Auditor {i:04d}" for i in range(0, auditors, 2)]
+    return pd.DataFrame({
+        'Auditor Name': names,
+        'Full Name': [f"{name} Full" for name in names],
+        'MFS Number': '1700000000',
+        'MFS Provider': 'bKash',
+    })
+
+
+def write_audit_csv(path, rows, generator):
+    make_audit_frame(rows, **generator).to_csv(path, index=False)
+
+
+def _run_pipeline(path, auditors, queue):
+    # The app pipeline end to end (read -> ... -> xlsx) under a StageProfiler
+    with StageProfiler(run=os.path.basename(path)) as profiler:
+        with stage('read_file') as info:
+            with open(path, 'rb') as f:
+                df_audit = read_audit_file(path, f.read())
+            info['rows'] = len(df_audit)
+        report_df, header_title, header_date_range = generate_report(df_audit, AUDIT_MAPPING, 3, make_mfs_frame(auditors))
+        ReportExports(report_df, header_title, header_date_range, 3).render('xlsx')
+    queue.put(profiler.records)
+
+
+def bench_pipeline(sizes, generator, json_out=None):
+    # Per-stage seconds / peak RSS at each size, each run in a fresh interpreter.
+    # Fixed seed and generator settings make runs comparable across commits.
+    results = []
+    print(f"{'rows':>12} {'stage':>14} {'seconds':>10} {'rows in':>12} {'peak RSS (MB)':>14}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in sizes:
+            path = os.path.join(tmp, f'audit_{rows}.csv')
+            _in_child(write_audit_csv, path, rows, generator)
+            ctx = multiprocessing.get_context('spawn')
+            queue = ctx.Queue()
+            proc = ctx.Process(target=_run_pipeline, args=(path, generator['auditors'], queue))
+            proc.start()
+            records = queue.get()
+            proc.join()
+            os.remove(path)
+
+            for record in records:
+                record_rows = '' if record['rows'] is None else f"{record['rows']:,}"
+                print(f"{rows:>12,} {record['stage']:>14} {record['seconds']:>10.3f} {record_rows:>12}"
+                      f" {record['peak_rss_mb'] or 0:>14.1f}")
+            total = sum(record['seconds'] for record in records)
+            print(f"{rows:>12,} {'total':>14} {total:>10.3f}")
+            results.append({'rows': rows, **generator, 'total_seconds': round(total, 6), 'stages': records})
+
+    if json_out:
+        with open(json_out, 'w') as f:
+            for result in results:
+                f.write(json.dumps(result) + '\n')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the salary report pipeline on synthetic audit data.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--auditors', type=int, default=200)
+    parser.add_argument('--reaudit-ratio', type=float, default=0.3, help="Share of rows re-audited")
+    parser.add_argument('--mismatch-ratio', type=float, default=0.2, help="Share of re-audits with a mismatch")
+    parser.add_argument('--days', type=int, default=31, help="Visit date span in days")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--suite', nargs='+', default=['aggregation'],
+                        choices=['aggregation', 'streaming', 'excel', 'slips', 'pipeline', 'schema', 'multifile', 'sweep',
+                                 'cube', 'ledger', 'mfs'])
+    parser.add_argument('--report-rows', type=int, nargs='+', default=[100, 1_000, 10_000],
+                        help="Auditor rows per report (excel, sweep and mfs suites)")
+    parser.add_argument('--slip-auditors', type=int, nargs='+', default=[500, 1_000],
+                        help="Auditors per report for the slips suite")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help="Render processes (slips suite) / parse threads (multifile suite)")
+    parser.add_argument('--sweep-scenarios', type=int, nargs='+', default=[1_000, 10_000],
+                        help="Approximate scenarios per grid for the sweep suite")
+    parser.add_argument('--files', type=int, default=4, help="Exports per upload for the multifile suite")
+    parser.add_argument('--smtp-port', type=int, default=8025, help="Port of the local SMTP stand-in (slips suite)")
+    parser.add_argument('--json-out', help="Write pipeline suite results as JSON lines (for regression tracking)")
+    args = parser.parse_args()
+    generator = {
+        'auditors': args.auditors, 'reaudit_ratio': args.reaudit_ratio, 'mismatch_ratio': args.mismatch_ratio,
+        'days': args.days, 'seed': args.seed,
+    }
+
+    if 'aggregation' in args.suite:
+        bench_aggregation(args.sizes, generator, args.repeat)
+    if 'streaming' in args.suite:
+        bench_streaming(args.sizes, args.auditors)
+    if 'excel' in args.suite:
+        bench_excel(args.report_rows, args.repeat)
+    if 'slips' in args.suite:
+        bench_slips(args.slip_auditors, args.workers, args.smtp_port)
+    if 'schema' in args.suite:
+        bench_schema(args.sizes, generator, args.repeat)
+    if 'multifile' in args.suite:
+        bench_multifile(args.sizes, generator, args.files, args.workers, args.repeat)
+    if 'mfs' in args.suite:
+        bench_mfs(args.report_rows)
+    if 'ledger' in args.suite:
+        bench_ledger(args.sizes, generator)
+    if 'cube' in args.suite:
+        bench_cube(args.sizes, generator)
+    if 'sweep' in args.suite:
+        bench_sweep(args.report_rows, args.sweep_scenarios, args.repeat)
+    if 'pipeline' in args.suite:
+        bench_pipeline(args.sizes, generator, args.json_out)
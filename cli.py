@@ -0,0 +1,126 @@
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from engine import build_report, detect_mapping, generate_report, prepare_mfs
+from export import EXPORT_FORMATS, ReportExports
+from ingest import read_audit_file, read_csv_header, stream_audit_csv
+from mfs import SHEET_URL, MFSLoader, parse_mfs_csv
+from profiling import StageProfiler, enable_json_logs, stage
+
+AUDIT_EXTENSIONS = ('.csv', '.xlsx')
+
+
+def find_audit_files(input_dir):
+    paths = []
+    for root, _, files in os.walk(input_dir):
+        for name in files:
+            if name.lower().endswith(AUDIT_EXTENSIONS) and not name.startswith('~$'):
+                paths.append(os.path.join(root, name))
+    return sorted(paths)
+
+
+def load_mfs(source):
+    if source.startswith(('http://', 'https://')):
+        loader = MFSLoader(source)
+        # Fresh copy if reachable, otherwise the last disk snapshot
+        loader.refresh()
+        df_mfs, _ = loader.load()
+        return df_mfs
+    with open(source, 'rb') as f:
+        return parse_mfs_csv(f.read())
+
+
+def output_stem(path, input_dir, output_dir):
+    # Keep region/month sub-folders distinct: north/2025-12.csv -> Salary_Report_north_2025-12
+    stem = os.path.splitext(os.path.relpath(path, input_dir))[0].replace(os.sep, '_')
+    return os.path.join(output_dir, f"Salary_Report_{stem}")
+
+
+def process_file(path, out_stem, unit_price, df_mfs, mapping=None, stream=False, formats=('xlsx',)):
+    # Returns (title, auditor count, auditors without MFS details, per-stage profile records)
+    with StageProfiler(run=path) as profiler:
+        if stream and path.lower().endswith('.csv'):
+            # Only the mapped columns are ever held in memory, a chunk at a time
+            if mapping is None:
+                mapping = detect_mapping(read_csv_header(path))
+            with stage('stream_csv'):
+                parsed = stream_audit_csv(path, mapping)
+            report_df = build_report(parsed['performance'], mapping[0], unit_price, df_mfs)
+            header_title, header_date_range = parsed['header_title'], parsed['header_date_range']
+        else:
+            with stage('read_file') as info:
+                with open(path, 'rb') as f:
+                    df_audit = read_audit_file(path.lower(), f.read())
+                info['rows'] = len(df_audit)
+            if mapping is None:
+                mapping = detect_mapping(df_audit.columns.tolist())
+            report_df, header_title, header_date_range = generate_report(df_audit, mapping, unit_price, df_mfs)
+
+        exports = ReportExports(report_df, header_title, header_date_range, unit_price)
+        for fmt in formats:
+            with open(f"{out_stem}.{EXPORT_FORMATS[fmt][1]}", 'wb') as f:
+                f.write(exports.render(fmt))
+    unmatched = prepare_mfs(df_mfs).unmatched(report_df['Auditor Name'])
+    return header_title, len(report_df) - 1, unmatched, profiler.records
+
+
+def run_batch(input_dir, output_dir, unit_price, df_mfs, mapping=None, workers=None, stream=False, formats=('xlsx',),
+              profile=False):
+    os.makedirs(output_dir, exist_ok=True)
+    paths = find_audit_files(input_dir)
+    failures = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(process_file, path, output_stem(path, input_dir, output_dir), unit_price, df_mfs, mapping, stream, formats): path
+            for path in paths
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                header_title, auditors, unmatched, records = future.result()
+                print(f"OK    {path} -> {header_title} ({auditors} auditors)")
+                if unmatched:
+                    print(f"WARN  {path}: no MFS details for {', '.join(map(str, unmatched))}", file=sys.stderr)
+                if profile:
+                    # Workers only collect; the parent logs so lines never interleave
+                    StageProfiler(run=path, records=records).log()
+            except Exception as e:
+                failures += 1
+                print(f"FAIL  {path}: {e}", file=sys.stderr)
+
+    return len(paths), failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate salary reports for every audit file in a directory.")
+    parser.add_argument('input_dir', help="Directory of audit exports (CSV/XLSX), searched recursively")
+    parser.add_argument('output_dir', help="Where the reports are written")
+    parser.add_argument('--unit-price', type=int, default=3, help="Unit Price (BDT), default 3")
+    parser.add_argument('--mfs', default=SHEET_URL, help="MFS CSV path or URL (default: Google Sheets database)")
+    parser.add_argument('--columns', nargs=4, metavar=('AUDITOR', 'VISIT_ID', 'RE_AUDITED', 'MISMATCH'),
+                        help="Column mapping; auto-detected per file when omitted")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument('--stream', action='store_true', help="Constant-memory chunked ingest for CSV files")
+    parser.add_argument('--formats', nargs='+', choices=sorted(EXPORT_FORMATS), default=['xlsx'],
+                        help="Output formats per report (default: xlsx)")
+    parser.add_argument('--profile', action='store_true',
+                        help="Log per-stage timings, row counts and peak RSS as JSON lines on stderr")
+    args = parser.parse_args(argv)
+
+    if args.profile:
+        enable_json_logs()
+    df_mfs = load_mfs(args.mfs)
+    total, failures = run_batch(
+        args.input_dir, args.output_dir, args.unit_price, df_mfs,
+        mapping=tuple(args.columns) if args.columns else None, workers=args.workers, stream=args.stream,
+        formats=args.formats, profile=args.profile,
+    )
+    print(f"{total - failures}/{total} reports written to {args.output_dir}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+
+from engine import finalize_performance, format_date_header
+
+# Region label for rows without a region (and for uploads with no region column)
+NO_REGION = '(no region)'
+
+CELL_KEYS = ['auditor', 'day', 'region']
+SUM_COLUMNS = ['re_audit_visited', 'mismatch_found_no_audit', 'mismatch_found_yes_audit']
+
+
+def find_region_col(columns):
+    # Search for a column with 'region' in its name
+    return next((col for col in columns if 'region' in col.lower()), None)
+
+
+class AuditCube:
+    # Per-upload pre-aggregate: one cell per (auditor, visit day, region) with the
+    # re-audit/mismatch sums. Filtering by date or region only re-rolls these cells,
+    # never the raw rows.
+    #
+    # Audited Visit is a distinct count, so it cannot simply be summed over cells.
+    # Visits that fall in a single cell are counted in that cell ('single_visits');
+    # the few that span several cells are kept as (auditor, visit, cell) codes and
+    # de-duplicated after filtering. Results equal filtering the raw rows first.
+
+    def __init__(self, df_audit, mapping, date_col=None, region_col=None):
+        # df_audit must already be typed (coerce_audit_types / extract_date_header)
+        col_assigned, col_visit, col_reaudit, col_mismatch = mapping
+        rows = df_audit[df_audit[col_assigned].notna()]
+        reaudited = rows[col_reaudit] == True
+
+        self.dated = date_col is not None and pd.api.types.is_datetime64_any_dtype(rows[date_col])
+        self.region_col = region_col
+        auditor_codes, self.auditors = pd.factorize(rows[col_assigned], sort=True)
+
+        cells = pd.DataFrame({
+            'auditor': auditor_codes,
+            'day': rows[date_col].dt.normalize() if self.dated else pd.NaT,
+            'region': rows[region_col].astype('string').fillna(NO_REGION) if region_col else NO_REGION,
+            're_audit_visited': rows[col_reaudit].astype('int64'),
+            'mismatch_found_no_audit': (reaudited & rows[col_mismatch].eq(False)).astype('int64'),
+            'mismatch_found_yes_audit': (reaudited & rows[col_mismatch].eq(True)).astype('int64'),
+        })
+        cell_ids = cells.groupby(CELL_KEYS, dropna=False, sort=False).ngroup().to_numpy()
+
+        grouped = cells.groupby(cell_ids)
+        self.cells = grouped[CELL_KEYS].first().join(grouped[SUM_COLUMNS].sum())
+
+        # Distinct visits per cell; rows without a visit id are not counted (like nunique)
+        visit_codes = pd.factorize(rows[col_visit])[0]
+        visits = pd.DataFrame({'auditor': auditor_codes, 'visit': visit_codes, 'cell': cell_ids})
+        visits = visits[visits['visit'] >= 0].drop_duplicates()
+        spread = visits.groupby(['auditor', 'visit'])['cell'].transform('size')
+        self.cells['single_visits'] = (
+            visits[spread == 1].groupby('cell').size().reindex(self.cells.index, fill_value=0)
+        )
+        self.spread_visits = visits[spread > 1].reset_index(drop=True)
+
+    # --- Filters ---
+    def days(self):
+        # (first, last) visit day in the upload, or (None, None) when undated
+        if not self.dated or self.cells['day'].isna().all():
+            return None, None
+        return self.cells['day'].min().date(), self.cells['day'].max().date()
+
+    def regions(self):
+        return sorted(self.cells['region'].unique().tolist())
+
+    def selection(self, start=None, end=None, regions=None):
+        # Boolean mask over cells. start/end are inclusive dates; undated rows
+        # drop out as soon as either bound is given.
+        selected = np.ones(len(self.cells), dtype=bool)
+        if start is not None:
+            selected &= (self.cells['day'] >= pd.Timestamp(start)).to_numpy()
+        if end is not None:
+            selected &= (self.cells['day'] <= pd.Timestamp(end)).to_numpy()
+        if regions is not None:
+            selected &= self.cells['region'].isin(list(regions)).to_numpy()
+        return selected
+
+    # --- Reporting ---
+    def performance(self, col_assigned, start=None, end=None, regions=None):
+        # Same frame as engine.aggregate_auditor_performance over the filtered rows
+        selected = self.selection(start, end, regions)
+        cells = self.cells[selected]
+        by_auditor = cells.groupby('auditor', sort=True)
+
+        spread = self.spread_visits[selected[self.spread_visits['cell'].to_numpy()]]
+        spread_counts = spread.drop_duplicates(['auditor', 'visit']).groupby('auditor').size()
+        audit_visited = by_auditor['single_visits'].sum().add(spread_counts, fill_value=0)
+
+        auditor_performance = pd.concat([audit_visited.rename('audit_visited'), by_auditor[SUM_COLUMNS].sum()], axis=1)
+        auditor_performance.index = pd.Index(self.auditors.take(auditor_performance.index.to_numpy()))
+        return finalize_performance(auditor_performance, col_assigned)
+
+    def date_header(self, start=None, end=None, regions=None):
+        days = self.cells.loc[self.selection(start, end, regions), 'day'].dropna()
+        if days.empty:
+            return format_date_header(None, None)
+        return format_date_header(days.min(), days.max())
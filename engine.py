@@ -0,0 +1,381 @@
+import hashlib
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from cache import LRUCache
+from profiling import stage
+
+# Fixed part of Max Payable; the rest is variable and scaled by (1 - mismatch rate).
+# The report columns, the Excel formulas and the payroll exports all derive from it.
+FIXED_SHARE = 0.75
+VARIABLE_SHARE = round(1 - FIXED_SHARE, 9)
+FIXED_COLUMN = f"Fixed ({FIXED_SHARE:.0%})"
+VARIABLE_COLUMN = f"Variable ({VARIABLE_SHARE:.0%})"
+
+# Display order of the report (matches the reference image)
+REPORT_COLUMNS = [
+    'Sl', 'Auditor Name', 'Audited Visit', 'Re-Audited Visit', 'Mismatch No', 'Mismatch Yes',
+    '% Mismatch in Re-Audit', 'Unit Price', 'Max Payable', FIXED_COLUMN, VARIABLE_COLUMN,
+    'Actual Payable', 'Full Name', 'MFS Number', 'MFS Provider'
+]
+PAYMENT_COLUMNS = ['Max Payable', FIXED_COLUMN, VARIABLE_COLUMN, 'Actual Payable']
+COUNT_COLUMNS = ['Audited Visit', 'Re-Audited Visit', 'Mismatch No', 'Mismatch Yes']
+MFS_COLUMNS = ['Auditor Name', 'Full Name', 'MFS Number', 'MFS Provider']
+
+# Spellings of yes/no flags in audit exports (matched stripped and lower-cased).
+# Blanks are False; any other non-empty text keeps the old truthy meaning.
+TRUE_TEXT = frozenset({'true', 'yes', 'y', 't', '1', '1.0'})
+FALSE_TEXT = frozenset({'false', 'no', 'n', 'f', '0', '0.0', '', 'nan', 'none', 'null', 'n/a', 'na', '-'})
+
+# MFS lookups per sheet content (and per sheet frame object, to skip hashing
+# the frame MFSLoader keeps serving); a new sheet version gets a new entry
+mfs_index_cache = LRUCache(max_entries=8)
+
+
+# --- Column Mapping ---
+def find_col(all_cols, preferred, keywords, default_index=0):
+    # Auto-detect with specific defaults prioritized
+    if preferred in all_cols:
+        return preferred
+    for col in all_cols:
+        if any(k in col.lower() for k in keywords):
+            return col
+    return all_cols[default_index] if all_cols else None
+
+
+def detect_mapping(all_cols):
+    # (auditor, visit id, re-audited, mismatch) column names
+    return (
+        find_col(all_cols, 'assigned_to', ['assign', 'auditor']),
+        find_col(all_cols, 'visit_id', ['visit', 'id']),
+        find_col(all_cols, 're_audited', ['re_audit', 'reaudited']),
+        find_col(all_cols, 'mismatch_found_in_reaudit', ['mismatch', 'found']),
+    )
+
+
+# --- Aggregation ---
+
+
+def aggregate_auditor_performance(df_audit, col_assigned, col_visit, col_reaudit, col_mismatch):
+    # Precompute the re-audit / mismatch masks once over the whole frame,
+    # then let a single columnar groupby do the per-auditor counting.
+    reaudited = df_audit[col_reaudit] == True
+    mismatch = df_audit[col_mismatch]
+
+    counts = pd.DataFrame({
+        'auditor': df_audit[col_assigned],
+        'visit': df_audit[col_visit],
+        're_audit': df_audit[col_reaudit],
+        'mismatch_no': reaudited & mismatch.eq(False),
+        'mismatch_yes': reaudited & mismatch.eq(True),
+    })
+
+    auditor_performance = counts.groupby('auditor', sort=True, observed=True).agg(
+        audit_visited=('visit', 'nunique'),
+        re_audit_visited=('re_audit', 'sum'),
+        mismatch_found_no_audit=('mismatch_no', 'sum'),
+        mismatch_found_yes_audit=('mismatch_yes', 'sum'),
+    )
+    return finalize_performance(auditor_performance, col_assigned)
+
+
+def finalize_performance(auditor_performance, col_assigned):
+    # Per-auditor count frame (indexed by auditor) -> flat frame with mismatch_rate
+    auditor_performance = auditor_performance.astype('int64')
+    if isinstance(auditor_performance.index, pd.CategoricalIndex):
+        # Categorical auditors (compact_audit_frame) come back as plain names
+        auditor_performance.index = auditor_performance.index.astype(auditor_performance.index.categories.dtype)
+    auditor_performance.index.name = col_assigned
+    auditor_performance = auditor_performance.reset_index()
+
+    # Calculate % for logic (keep as float)
+    auditor_performance['mismatch_rate'] = (
+        auditor_performance['mismatch_found_yes_audit'] / auditor_performance['re_audit_visited']
+    ).fillna(0)
+
+    return auditor_performance
+
+
+def _truth(value):
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, float, np.number)):
+        return bool(value == value and value != 0)
+    text = str(value).strip().lower()
+    if text in TRUE_TEXT:
+        return True
+    if text in FALSE_TEXT:
+        return False
+    return bool(text)
+
+
+def parse_bool(values):
+    # Yes/No, TRUE/FALSE, 1/0 and blanks -> bool. Only the distinct values are
+    # interpreted; the rows are mapped through one factorize/take pass.
+    if pd.api.types.is_bool_dtype(values) and not values.hasnans:
+        return values.astype(bool)
+    codes, uniques = pd.factorize(values)
+    # Missing values get code -1, i.e. the trailing False
+    lookup = np.array([_truth(value) for value in uniques] + [False], dtype=bool)
+    return pd.Series(lookup[codes], index=values.index, name=values.name)
+
+
+def compact_ids(values):
+    # Numeric visit ids -> smallest integer dtype (nullable when some are blank);
+    # text ids -> categorical. Distinct counts are unchanged either way.
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        present = values.dropna()
+        if (present % 1 == 0).all():
+            return pd.to_numeric(values.astype('Int64') if values.hasnans else values.astype('int64'), downcast='integer')
+        return values
+    return values.astype('category')
+
+
+def visit_keys(values):
+    # Stable text keys: 123, 123.0 and '123' all map to '123' across uploads
+    numeric = pd.to_numeric(values, errors='coerce')
+    if numeric.notna().sum() == values.notna().sum() and (numeric.dropna() % 1 == 0).all():
+        return numeric.astype('Int64').astype('string')
+    return values.astype('string').str.strip()
+
+
+def frame_memory_mb(df):
+    return df.memory_usage(deep=True).sum() / 2**20
+
+
+def coerce_audit_types(df_audit, col_reaudit, col_mismatch):
+    # Ensure columns are the right types (returns a new frame, input untouched)
+    return df_audit.assign(**{
+        col_reaudit: parse_bool(df_audit[col_reaudit]),
+        col_mismatch: parse_bool(df_audit[col_mismatch]),
+    })
+
+
+def compact_audit_frame(df_audit, col_assigned, col_visit, col_reaudit, col_mismatch):
+    # Schema stage: real booleans, categorical auditors, compact visit ids and
+    # downcast integer columns (returns a new frame, input untouched)
+    columns = {
+        col_assigned: df_audit[col_assigned].astype('category'),
+        col_visit: compact_ids(df_audit[col_visit]),
+        col_reaudit: parse_bool(df_audit[col_reaudit]),
+        col_mismatch: parse_bool(df_audit[col_mismatch]),
+    }
+    for col in df_audit.columns:
+        if col not in columns and pd.api.types.is_integer_dtype(df_audit[col]):
+            columns[col] = pd.to_numeric(df_audit[col], downcast='integer')
+    return df_audit.assign(**columns)
+
+
+def find_date_col(columns):
+    # Search for a column with 'date' in its name
+    return next((col for col in columns if 'date' in col.lower()), None)
+
+
+def format_date_header(start_date, end_date):
+    if start_date is None or end_date is None:
+        return "GP GLM Auditor's Salary", "Visit Date: [Date Not Found]"
+
+    # Format: dd-Month-yyyy
+    start_str = start_date.strftime('%d-%B-%Y')
+    end_str = end_date.strftime('%d-%B-%Y')
+
+    header_date_range = f"Visit Date: {start_str} to {end_str}"
+    # Salary month based on end date: e.g., December'2025
+    header_title = f"GP GLM Auditor's Salary- {end_date.strftime('%B')}'{end_date.year}"
+    return header_title, header_date_range
+
+
+def extract_date_header(df_audit):
+    date_col = find_date_col(df_audit.columns)
+    start_date = end_date = None
+
+    if date_col:
+        # Attempt to parse dates
+        try:
+            df_audit = df_audit.assign(**{date_col: pd.to_datetime(df_audit[date_col])})
+            valid_dates = df_audit[date_col].dropna()
+            if not valid_dates.empty:
+                start_date = valid_dates.min()
+                end_date = valid_dates.max()
+        except Exception:
+            pass
+
+    header_title, header_date_range = format_date_header(start_date, end_date)
+    return df_audit, header_title, header_date_range
+
+
+# --- Salary & Report ---
+def compute_salary(auditor_performance, unit_price, col_assigned):
+    auditor_performance = auditor_performance.copy()
+
+    # Performance Calculations
+    auditor_performance['Unit Price'] = unit_price
+    auditor_performance['Max Payable'] = auditor_performance['audit_visited'] * unit_price
+    auditor_performance[FIXED_COLUMN] = auditor_performance['Max Payable'] * FIXED_SHARE
+    auditor_performance[VARIABLE_COLUMN] = (auditor_performance['Max Payable'] * VARIABLE_SHARE) * (1 - auditor_performance['mismatch_rate'])
+    auditor_performance['Actual Payable'] = auditor_performance[FIXED_COLUMN] + auditor_performance[VARIABLE_COLUMN]
+
+    # Final Percentage for display
+    auditor_performance['% Mismatch in Re-Audit'] = auditor_performance['mismatch_rate'] * 100
+
+    # Rename columns for display
+    return auditor_performance.rename(columns={
+        col_assigned: 'Auditor Name',
+        'audit_visited': 'Audited Visit',
+        're_audit_visited': 'Re-Audited Visit',
+        'mismatch_found_no_audit': 'Mismatch No',
+        'mismatch_found_yes_audit': 'Mismatch Yes'
+    })
+
+
+def frame_fingerprint(df):
+    # Content hash of a frame's values and column names
+    row_hashes = pd.util.hash_pandas_object(df.astype(str), index=False).to_numpy()
+    digest = hashlib.blake2b(row_hashes.tobytes(), digest_size=16)
+    digest.update('\x1f'.join(map(str, df.columns)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def normalize_names(values):
+    # Join key for auditor names: Unicode-normalised, case-folded, single-spaced
+    return (
+        values.astype('string').str.normalize('NFKC').str.casefold()
+        .str.replace(r'\s+', ' ', regex=True).str.strip()
+    )
+
+
+def normalize_mfs_numbers(values):
+    # Digits only ('1571585237.0', '0157-158 5237' -> '01571585237'), with the
+    # leading zero the sheet tends to drop put back; blanks stay missing
+    numbers = values.astype('string').str.strip().str.replace(r'\.0+$', '', regex=True)
+    numbers = numbers.str.replace(r'[\s\-()]', '', regex=True).replace('', pd.NA)
+    return numbers.where(numbers.str.startswith('0').fillna(True), '0' + numbers)
+
+
+def find_alias_col(columns):
+    # Optional sheet column of other spellings, separated by ',', ';' or '|'
+    return next((col for col in columns if 'alias' in col.lower()), None)
+
+
+class MFSIndex:
+    # Payment details keyed by normalised auditor name (and any aliases), built
+    # once per sheet version. Lookups are a reindex on the key, not a merge.
+    # The first sheet row wins for a repeated name; sheet names win over aliases.
+
+    def __init__(self, df_mfs):
+        details = df_mfs[MFS_COLUMNS].reset_index(drop=True)
+        details = details.assign(**{'MFS Number': normalize_mfs_numbers(details['MFS Number'])})
+        keys = normalize_names(details['Auditor Name'])
+
+        alias_col = find_alias_col(df_mfs.columns)
+        if alias_col is not None:
+            aliases = df_mfs[alias_col].reset_index(drop=True).astype('string').str.split(r'[,;|]').explode().dropna()
+            alias_keys = normalize_names(aliases)
+            alias_keys = alias_keys[alias_keys != '']
+            keys = pd.concat([keys, alias_keys])
+
+        positions = pd.Series(keys.index, index=pd.Index(keys.to_numpy(), dtype='string'))
+        positions = positions[positions.index.notna()]
+        self.duplicates = sorted(set(positions.index[positions.index.duplicated()]))
+        positions = positions[~positions.index.duplicated()]
+        self.table = details.drop(columns='Auditor Name').iloc[positions.to_numpy()].set_axis(positions.index)
+
+    def lookup(self, names):
+        # Full Name / MFS Number / MFS Provider for each name, aligned to `names`
+        return self.table.reindex(normalize_names(names).to_numpy()).set_axis(names.index)
+
+    def unmatched(self, names):
+        names = names[names != 'GRAND TOTAL']
+        return names[~normalize_names(names).isin(self.table.index).to_numpy()].tolist()
+
+
+def prepare_mfs(df_mfs):
+    # Cached MFSIndex for this sheet. MFSLoader hands out the same frame until the
+    # sheet changes, so that case is an identity check; other frames are hashed.
+    frame_key = ('frame', id(df_mfs))
+    entry = mfs_index_cache.get(frame_key)
+    if entry is not None and entry[0]() is df_mfs:
+        return entry[1]
+    mfs_index = mfs_index_cache.get_or_create(frame_fingerprint(df_mfs), lambda: MFSIndex(df_mfs))
+    mfs_index_cache.put(frame_key, (weakref.ref(df_mfs), mfs_index))
+    return mfs_index
+
+
+def build_salary_report(salary_df, mfs_index):
+    # --- Join MFS Details ---
+    combined_df = salary_df.join(mfs_index.lookup(salary_df['Auditor Name']))
+
+    # Insert 'Sl' column at the beginning
+    combined_df.insert(0, 'Sl', range(1, len(combined_df) + 1))
+
+    # Add Grand Total row
+    numeric_cols = COUNT_COLUMNS + PAYMENT_COLUMNS
+    totals = combined_df[numeric_cols].sum()
+
+    total_row = pd.DataFrame([{
+        'Auditor Name': 'GRAND TOTAL',
+        **totals.to_dict(),
+        '% Mismatch in Re-Audit': (totals['Mismatch Yes'] / totals['Re-Audited Visit'] * 100) if totals['Re-Audited Visit'] > 0 else 0,
+        'Unit Price': ''
+    }])
+    return pd.concat([combined_df, total_row], ignore_index=True)
+
+
+def excel_round(values):
+    # Excel ROUND(x, 0): halves go away from zero (NumPy rounds half to even).
+    # The 9-decimal pre-round absorbs float noise such as 2.4999999999 for 2.5.
+    values = np.round(np.asarray(values, dtype='float64'), 9)
+    return np.sign(values) * np.floor(np.abs(values) + 0.5)
+
+
+def payroll_frame(report_df):
+    # Per-auditor payouts exactly as the Excel formulas compute them, with
+    # machine-friendly column names for downstream payroll systems
+    rows = report_df[report_df['Auditor Name'] != 'GRAND TOTAL']
+    re_audited = rows['Re-Audited Visit'].to_numpy(dtype='float64')
+    mismatch_yes = rows['Mismatch Yes'].to_numpy(dtype='float64')
+    mismatch_rate = np.divide(mismatch_yes, re_audited, out=np.zeros_like(re_audited), where=re_audited != 0)
+    unit_price = pd.to_numeric(rows['Unit Price']).to_numpy(dtype='float64')
+
+    max_payable = excel_round(rows['Audited Visit'].to_numpy(dtype='float64') * unit_price)
+    fixed = excel_round(max_payable * FIXED_SHARE)
+    variable = excel_round((max_payable * VARIABLE_SHARE) * (1 - mismatch_rate))
+
+    return pd.DataFrame({
+        'auditor_name': rows['Auditor Name'].astype('string'),
+        'full_name': rows['Full Name'].astype('string'),
+        'mfs_number': rows['MFS Number'].astype('string'),
+        'mfs_provider': rows['MFS Provider'].astype('string'),
+        'audited_visit': rows['Audited Visit'].astype('int64'),
+        're_audited_visit': rows['Re-Audited Visit'].astype('int64'),
+        'mismatch_no': rows['Mismatch No'].astype('int64'),
+        'mismatch_yes': rows['Mismatch Yes'].astype('int64'),
+        'mismatch_rate': mismatch_rate,
+        'unit_price': unit_price,
+        'max_payable': max_payable.astype('int64'),
+        'fixed_payable': fixed.astype('int64'),
+        'variable_payable': variable.astype('int64'),
+        'actual_payable': (fixed + variable).astype('int64'),
+    }).reset_index(drop=True)
+
+
+def build_report(auditor_performance, col_assigned, unit_price, df_mfs):
+    with stage('salary', rows=len(auditor_performance)):
+        salary_df = compute_salary(auditor_performance, unit_price, col_assigned)
+    with stage('mfs_merge', rows=len(salary_df)):
+        return build_salary_report(salary_df, prepare_mfs(df_mfs))
+
+
+def generate_report(df_audit, mapping, unit_price, df_mfs):
+    # Headless pipeline: raw audit frame -> (report frame with Grand Total row, title, date range)
+    col_assigned, col_visit, col_reaudit, col_mismatch = mapping
+    with stage('compact_types', rows=len(df_audit)):
+        df_audit = compact_audit_frame(df_audit, *mapping)
+    with stage('parse_dates', rows=len(df_audit)):
+        df_audit, header_title, header_date_range = extract_date_header(df_audit)
+    with stage('aggregate', rows=len(df_audit)):
+        auditor_performance = aggregate_auditor_performance(df_audit, *mapping)
+    report_df = build_report(auditor_performance, col_assigned, unit_price, df_mfs)
+    return report_df, header_title, header_date_range
@@ -0,0 +1,295 @@
+import io
+import json
+
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font, NamedStyle, PatternFill, Border, Side
+from openpyxl.styles.fonts import DEFAULT_FONT
+from openpyxl.utils import get_column_letter
+
+from cache import LRUCache
+from engine import (
+    FIXED_COLUMN, FIXED_SHARE, PAYMENT_COLUMNS, REPORT_COLUMNS, VARIABLE_COLUMN, VARIABLE_SHARE, frame_fingerprint,
+    payroll_frame,
+)
+from profiling import stage
+
+# Exclude 'Sl' for Excel to match the image
+EXPORT_COLUMNS = [
+    'Auditor Name', 'Audited Visit', 'Re-Audited Visit',
+    'Mismatch No', 'Mismatch Yes', '% Mismatch in Re-Audit',
+    'Unit Price', 'Max Payable', FIXED_COLUMN, VARIABLE_COLUMN,
+    'Actual Payable', 'Full Name', 'MFS Number', 'MFS Provider'
+]
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+EXPORT_FORMATS = {
+    # format: (mime, file extension)
+    'csv': ("text/csv", 'csv'),
+    'xlsx': (XLSX_MIME, 'xlsx'),
+    'parquet': ("application/vnd.apache.parquet", 'parquet'),
+    'json': ("application/json", 'json'),
+}
+
+# Rendered bytes per (report fingerprint, title, date range, unit price, format)
+export_cache = LRUCache(max_entries=16)
+
+# --- Color and Style Definitions ---
+BLUE_FILL = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
+YELLOW_FILL = PatternFill(start_color='FFF2CC', end_color='FFF2CC', fill_type='solid')
+WHITE_FONT = Font(color='FFFFFF', bold=True, size=12)
+BLACK_BOLD_FONT = Font(bold=True)
+CENTER_ALIGNED = Alignment(horizontal='center', vertical='center', wrap_text=True)
+LEFT_ALIGNED = Alignment(horizontal='left')
+THIN_BORDER = Border(
+    left=Side(style='thin'), right=Side(style='thin'),
+    top=Side(style='thin'), bottom=Side(style='thin')
+)
+
+PERCENT_FORMAT = '0.00%'
+MONEY_FORMAT = '#,##0'
+
+# --- Table Headers (Rows 3 & 4) ---
+# Columns: A(Auditor), B(Audited), C(ReAudited), D-F(Mismatch), G(Unit), H(Max), I(Fixed), J(Variable), K(Actual), L(Full), M(MFS), N(Provider)
+HEADERS = [
+    (3, 1, 4, 1, "Auditor Name"),
+    (3, 2, 4, 2, "Audited Visit"),
+    (3, 3, 4, 3, "Re-Audited\nVisit"),
+    (3, 4, 3, 6, "Mismatch found"), # Parent for No, Yes, %
+    (4, 4, 4, 4, "No"),
+    (4, 5, 4, 5, "Yes"),
+    (4, 6, 4, 6, "%"),
+    (3, 7, 4, 7, "Unit Price"),
+    (3, 8, 4, 8, "Max Payable"),
+    (3, 9, 3, 9, "Fixed"),
+    (4, 9, 4, 9, f"{FIXED_SHARE:.0%}"),
+    (3, 10, 3, 10, "Variable"),
+    (4, 10, 4, 10, f"{VARIABLE_SHARE:.0%}"),
+    (3, 11, 4, 11, "Actual\nPayable"),
+    (3, 12, 4, 12, "Full Name"),
+    (3, 13, 4, 13, "MFS Number"),
+    (3, 14, 4, 14, "MFS Provider"),
+]
+
+# Set column widths for better visibility
+COLUMN_WIDTHS = [25, 12, 12, 8, 8, 10, 10, 12, 10, 10, 12, 25, 15, 15]
+
+DATA_START_ROW = 5
+PAYABLE_COL = 11
+PAYMENT_COLS = (8, 9, 10, 11)
+TOTAL_SUM_COLS = (2, 3, 4, 5, 8, 9, 10, 11)
+
+
+def report_filename(header_title, extension='xlsx'):
+    return f"Salary_Report_{header_title.split('- ')[-1]}.{extension}"
+
+
+def _report_styles():
+    # Registered once per workbook; cells then only carry a style name.
+    # Unstyled fonts stay on the workbook default, as with per-cell styling.
+    body = dict(border=THIN_BORDER, alignment=CENTER_ALIGNED, font=DEFAULT_FONT)
+    payable = dict(body, fill=YELLOW_FILL, font=BLACK_BOLD_FONT)
+    return [
+        NamedStyle('Report Title', fill=BLUE_FILL, font=WHITE_FONT, alignment=CENTER_ALIGNED),
+        NamedStyle('Report Header', font=BLACK_BOLD_FONT, border=THIN_BORDER, alignment=CENTER_ALIGNED),
+        NamedStyle('Report Header Edge', border=THIN_BORDER, font=DEFAULT_FONT),
+        NamedStyle('Report Name', border=THIN_BORDER, alignment=LEFT_ALIGNED, font=DEFAULT_FONT),
+        NamedStyle('Report Body', **body),
+        NamedStyle('Report Percent', number_format=PERCENT_FORMAT, **body),
+        NamedStyle('Report Money', number_format=MONEY_FORMAT, **body),
+        NamedStyle('Report Payable', **payable),
+        NamedStyle('Report Payable Money', number_format=MONEY_FORMAT, **payable),
+    ]
+
+
+def _cell_value(value):
+    # Blank cells for NaN/'' exactly like DataFrame.to_excel
+    if isinstance(value, str):
+        return value or None
+    if value is None or pd.isna(value):
+        return None
+    return value.item() if hasattr(value, 'item') else value
+
+
+def _row_formulas(row_idx):
+    return {
+        # % Mismatch (E/C), denominator is column C (Re-Audited Visit)
+        6: f"=IF(C{row_idx}=0, 0, E{row_idx}/C{row_idx})",
+        # Max Payable (B*G), Fixed (H*FIXED_SHARE), Variable ((H*VARIABLE_SHARE)*(1-F)) - Rounded to 0
+        8: f"=ROUND(B{row_idx}*G{row_idx}, 0)",
+        9: f"=ROUND(H{row_idx}*{FIXED_SHARE}, 0)",
+        10: f"=ROUND((H{row_idx}*{VARIABLE_SHARE})*(1-F{row_idx}), 0)",
+        # Actual (I+J)
+        11: f"=I{row_idx}+J{row_idx}",
+    }
+
+
+def _total_formulas(row_idx):
+    formulas = {
+        col: f"=SUM({get_column_letter(col)}{DATA_START_ROW}:{get_column_letter(col)}{row_idx - 1})"
+        for col in TOTAL_SUM_COLS
+    }
+    # Total %: =IF(C=0, 0, E/C)
+    formulas[6] = f"=IF(C{row_idx}=0, 0, E{row_idx}/C{row_idx})"
+    return formulas
+
+
+def _body_style(col_idx, has_formula):
+    if col_idx == 1:
+        return 'Report Name'
+    if col_idx == PAYABLE_COL:
+        return 'Report Payable Money' if has_formula else 'Report Payable'
+    if col_idx == 6 and has_formula:
+        return 'Report Percent'
+    if col_idx in PAYMENT_COLS and has_formula:
+        return 'Report Money'
+    return 'Report Body'
+
+
+def write_excel_report(excel_df, header_title, header_date_range, has_total=True):
+    # Excel export with high-fidelity styling, streamed through a write-only
+    # workbook (rows are serialised as they are appended); returns the .xlsx bytes.
+    # has_total=False writes every row as an auditor row (salary slips).
+    num_cols = len(EXPORT_COLUMNS)
+    workbook = Workbook(write_only=True)
+    for style in _report_styles():
+        workbook.add_named_style(style)
+    worksheet = workbook.create_sheet('Salary Report')
+
+    # Column widths must be set before the first row is written
+    for i, width in enumerate(COLUMN_WIDTHS):
+        worksheet.column_dimensions[get_column_letter(i + 1)].width = width
+
+    def styled(value, style):
+        cell = WriteOnlyCell(worksheet, value=value)
+        cell.style = style
+        return cell
+
+    # --- 1. Main Headers (Rows 1 & 2) ---
+    for title in (header_title, f"[{header_date_range}]"):
+        worksheet.append([styled(title, 'Report Title')] + [styled(None, 'Report Title') for _ in range(num_cols - 1)])
+    worksheet.merged_cells.add(f"A1:{get_column_letter(num_cols)}1")
+    worksheet.merged_cells.add(f"A2:{get_column_letter(num_cols)}2")
+
+    # --- 2. Table Headers (Rows 3 & 4) ---
+    header_rows = {3: [None] * num_cols, 4: [None] * num_cols}
+    for s_row, s_col, e_row, e_col, val in HEADERS:
+        if s_row != e_row or s_col != e_col:
+            worksheet.merged_cells.add(f"{get_column_letter(s_col)}{s_row}:{get_column_letter(e_col)}{e_row}")
+        for r in range(s_row, e_row + 1):
+            for c in range(s_col, e_col + 1):
+                header_rows[r][c - 1] = ('Report Header', val) if (r, c) == (s_row, s_col) else ('Report Header Edge', None)
+    for r in (3, 4):
+        worksheet.append([styled(val, style) for style, val in header_rows[r]])
+
+    # --- 3. Data Rows & Formulas ---
+    num_auditors = len(excel_df) - 1 if has_total else len(excel_df)
+    for i, values in enumerate(excel_df[EXPORT_COLUMNS].itertuples(index=False, name=None)):
+        row_idx = DATA_START_ROW + i
+        # Last row is the Grand Total
+        formulas = _total_formulas(row_idx) if i == num_auditors else _row_formulas(row_idx)
+        worksheet.append([
+            styled(formulas.get(col_idx, _cell_value(value)), _body_style(col_idx, col_idx in formulas))
+            for col_idx, value in enumerate(values, start=1)
+        ])
+
+    excel_buffer = io.BytesIO()
+    workbook.save(excel_buffer)
+    return excel_buffer.getvalue()
+
+
+# --- Payroll Formats ---
+def write_payroll_json(excel_df, header_title, header_date_range):
+    payroll = payroll_frame(excel_df)
+    document = {
+        'title': header_title,
+        'visit_dates': header_date_range,
+        'auditors': json.loads(payroll.to_json(orient='records')),
+        'total_payable': int(payroll['actual_payable'].sum()),
+    }
+    return json.dumps(document, ensure_ascii=False, indent=2).encode('utf-8')
+
+
+def write_payroll_parquet(excel_df, header_title, header_date_range):
+    payroll = payroll_frame(excel_df)
+    # Stored in the file's pandas metadata by the pyarrow engine
+    payroll.attrs = {'title': header_title, 'visit_dates': header_date_range}
+    buffer = io.BytesIO()
+    payroll.to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+
+# --- Lazy, Memoized Exports ---
+def report_fingerprint(report_df):
+    # Content hash of the report values; cheap next to any of the renderers
+    return frame_fingerprint(report_df)
+
+
+# --- Report Table / CSV ---
+TEXT_DISPLAY_COLUMNS = ['Auditor Name', 'Full Name', 'MFS Number', 'MFS Provider']
+INT_DISPLAY_COLUMNS = ['Sl', 'Audited Visit', 'Re-Audited Visit', 'Mismatch No', 'Mismatch Yes'] + PAYMENT_COLUMNS
+
+
+def format_for_display(df_total_row):
+    # Report table as shown in the app and written to CSV: REPORT_COLUMNS order,
+    # whole-number counts and payments. Numbers stay numeric so the table sorts
+    # numerically; zeros and missing values become <NA> (blank cells).
+    combined_df = df_total_row[REPORT_COLUMNS].copy()
+
+    # Whole numbers for counts and payments (round half to even, like round())
+    for col in INT_DISPLAY_COLUMNS:
+        values = pd.to_numeric(combined_df[col]).round().astype('Int64')
+        combined_df[col] = values.mask(values == 0)
+
+    combined_df['% Mismatch in Re-Audit'] = pd.to_numeric(combined_df['% Mismatch in Re-Audit']).round().astype('Int64')
+    # Grand Total carries a blank Unit Price
+    combined_df['Unit Price'] = pd.to_numeric(combined_df['Unit Price'], errors='coerce').convert_dtypes()
+    combined_df[TEXT_DISPLAY_COLUMNS] = combined_df[TEXT_DISPLAY_COLUMNS].fillna('')
+
+    return combined_df
+
+
+def write_report_csv(csv_df):
+    # The table keeps '% Mismatch in Re-Audit' numeric (the '%' comes from its
+    # column config), so the CSV writes the unit into the cell ('20%'); blanks stay blank
+    percent = csv_df['% Mismatch in Re-Audit']
+    csv_df = csv_df.assign(**{'% Mismatch in Re-Audit': percent.astype('string') + '%'})
+    return csv_df.to_csv(index=False).encode('utf-8')
+
+
+class ReportExports:
+    # Renders each download format only when asked for, and serves repeat
+    # requests for the same report from export_cache.
+
+    def __init__(self, excel_df, header_title, header_date_range, unit_price, csv_df=None):
+        # csv_df: the already formatted table (format_for_display), if the caller has one
+        self.excel_df = excel_df
+        self.csv_df = csv_df
+        self.header_title = header_title
+        self.header_date_range = header_date_range
+        self.key = (report_fingerprint(excel_df), header_title, header_date_range, unit_price)
+
+    def render(self, fmt):
+        return export_cache.get_or_create((self.key, fmt), lambda: self._render(fmt))
+
+    def renderer(self, fmt):
+        # Zero-argument callable for st.download_button(data=...), run on click
+        return lambda: self.render(fmt)
+
+    def mime(self, fmt):
+        return EXPORT_FORMATS[fmt][0]
+
+    def filename(self, fmt):
+        return report_filename(self.header_title, EXPORT_FORMATS[fmt][1])
+
+    def _render(self, fmt):
+        with stage(f'export_{fmt}', rows=len(self.excel_df)):
+            if fmt == 'csv':
+                csv_df = format_for_display(self.excel_df) if self.csv_df is None else self.csv_df
+                return write_report_csv(csv_df)
+            writer = {
+                'xlsx': write_excel_report,
+                'parquet': write_payroll_parquet,
+                'json': write_payroll_json,
+            }[fmt]
+            return writer(self.excel_df, self.header_title, self.header_date_range)
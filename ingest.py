@@ -0,0 +1,262 @@
+import hashlib
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from cache import LRUCache
+from cube import AuditCube, find_region_col
+from engine import (
+    aggregate_auditor_performance, coerce_audit_types, compact_audit_frame, extract_date_header,
+    finalize_performance, find_date_col, format_date_header, frame_memory_mb, visit_keys,
+)
+from profiling import stage
+
+# Raw frames are large, so only the last couple of uploads are kept; typed
+# entries share unchanged columns with their raw frame (copy-on-write).
+# Multi-file uploads are cached as one combined frame in typed_cache, not per file.
+raw_cache = LRUCache(max_entries=2)
+typed_cache = LRUCache(max_entries=8)
+
+_hash_memo = LRUCache(max_entries=16)
+_header_cache = LRUCache(max_entries=16)
+
+STREAM_CHUNK_ROWS = 250_000
+PARSE_WORKERS = 4
+
+
+def content_hash(audit_file):
+    # Streamlit hands out a stable file_id per upload, so the (expensive) hash
+    # of a large file is computed once rather than on every rerun.
+    memo_key = (getattr(audit_file, 'file_id', None), audit_file.name, audit_file.size)
+    digest = _hash_memo.get(memo_key) if memo_key[0] is not None else None
+    if digest is None:
+        digest = hashlib.blake2b(audit_file.getbuffer(), digest_size=16).hexdigest()
+        if memo_key[0] is not None:
+            _hash_memo.put(memo_key, digest)
+    return digest
+
+
+def read_audit_file(name, data):
+    if name.lower().endswith('.csv'):
+        return pd.read_csv(io.BytesIO(data))
+    # .xlsx
+    return pd.read_excel(io.BytesIO(data))
+
+
+def read_audit_header(name, data):
+    # Column names only; no rows are parsed
+    if name.lower().endswith('.csv'):
+        return pd.read_csv(io.BytesIO(data), nrows=0).columns.tolist()
+    return pd.read_excel(io.BytesIO(data), nrows=0).columns.tolist()
+
+
+def load_audit_frame(audit_file):
+    # Parsed, untyped upload. Treat the result as read-only: it is shared across reruns.
+    key = content_hash(audit_file)
+
+    def build():
+        with stage('read_file') as info:
+            df = read_audit_file(audit_file.name, audit_file.getvalue())
+            info['rows'] = len(df)
+        return df
+
+    return key, raw_cache.get_or_create(key, build)
+
+
+# --- Multi-File Uploads ---
+def load_audit_headers(audit_files):
+    # Header-only pass over every upload, enough for column auto-detection
+    return [
+        _header_cache.get_or_create(content_hash(f), lambda f=f: read_audit_header(f.name, f.getvalue()))
+        for f in audit_files
+    ]
+
+
+def common_columns(headers):
+    # Columns every file has, in the first file's order
+    shared = set(headers[0]).intersection(*headers[1:])
+    return [col for col in headers[0] if col in shared]
+
+
+def upload_key(keys):
+    # One key for a set of files; a single file keeps its own content hash
+    if len(keys) == 1:
+        return keys[0]
+    return hashlib.blake2b('|'.join(keys).encode('ascii'), digest_size=16).hexdigest()
+
+
+def load_audit_frames(audit_files, max_workers=PARSE_WORKERS):
+    # Parsed, untyped frames (one per file, in upload order), parsed concurrently;
+    # the C CSV tokenizer runs without the GIL. Not cached per file: callers
+    # cache what they build from them.
+    def parse(audit_file):
+        return read_audit_file(audit_file.name, audit_file.getvalue())
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(audit_files))) as pool:
+        return list(pool.map(parse, audit_files))
+
+
+def combine_audit_frames(frames, col_assigned, col_visit):
+    # One frame from several exports. A visit (auditor, visit id) that an earlier
+    # file already has is dropped from later files, so overlapping exports count
+    # it once in Audited Visit and in the re-audit/mismatch sums.
+    if len(frames) == 1:
+        return frames[0]
+
+    visit_dtypes = {str(df[col_visit].dtype) for df in frames}
+    combined = pd.concat(frames, ignore_index=True)
+    if len(visit_dtypes) > 1:
+        # e.g. numeric ids in a CSV and text ids in an XLSX: compare them as text keys
+        combined[col_visit] = visit_keys(combined[col_visit])
+
+    file_order = np.repeat(np.arange(len(frames)), [len(df) for df in frames])
+    pairs = pd.DataFrame({'auditor': combined[col_assigned], 'visit': combined[col_visit], 'file': file_order})
+    first_file = pairs.groupby(['auditor', 'visit'], sort=False)['file'].transform('min')
+    # Rows without an auditor or visit id cannot be matched across files and are kept
+    keep = first_file.isna().to_numpy() | (first_file.to_numpy() == file_order)
+    return combined[keep].reset_index(drop=True)
+
+
+def load_combined_audit(audit_files, col_assigned, col_visit):
+    # (key, combined raw frame, rows across all files) for an upload of one or
+    # more files. The combined frame is cached per file set and auditor/visit
+    # mapping, so files are only parsed when either changes.
+    if len(audit_files) == 1:
+        key, df_audit = load_audit_frame(audit_files[0])
+        return key, df_audit, len(df_audit)
+
+    key = upload_key([content_hash(f) for f in audit_files])
+
+    def build():
+        # Pool threads do not inherit the profiler context, so the whole pass is timed here
+        with stage('read_files') as info:
+            frames = load_audit_frames(audit_files)
+            info['rows'] = sum(len(df) for df in frames)
+        with stage('combine_files', rows=info['rows']):
+            return combine_audit_frames(frames, col_assigned, col_visit), info['rows']
+
+    combined, source_rows = typed_cache.get_or_create((key, col_assigned, col_visit, 'combined'), build)
+    return key, combined, source_rows
+
+
+def load_typed_audit(key, df_audit, col_assigned, col_visit, col_reaudit, col_mismatch):
+    # Typed frame, header info, per-auditor counts and frame memory (MB, raw -> typed)
+    # for one (upload, mapping) pair.
+    # Unit price and other widgets never reach this key, so they reuse the entry.
+    mapping = (col_assigned, col_visit, col_reaudit, col_mismatch)
+
+    def build():
+        with stage('compact_types', rows=len(df_audit)):
+            df_typed = compact_audit_frame(df_audit, *mapping)
+        with stage('parse_dates', rows=len(df_typed)):
+            df_typed, header_title, header_date_range = extract_date_header(df_typed)
+        with stage('aggregate', rows=len(df_typed)):
+            auditor_performance = aggregate_auditor_performance(df_typed, *mapping)
+        return {
+            'df': df_typed,
+            'header_title': header_title,
+            'header_date_range': header_date_range,
+            'performance': auditor_performance,
+            'memory_mb': (frame_memory_mb(df_audit), frame_memory_mb(df_typed)),
+        }
+
+    return typed_cache.get_or_create((key, mapping), build)
+
+
+def load_audit_cube(key, df_typed, mapping):
+    # Date/region cube for one (upload, mapping) pair, built once; filter
+    # changes only re-roll its cells
+    def build():
+        with stage('build_cube', rows=len(df_typed)):
+            return AuditCube(df_typed, mapping, find_date_col(df_typed.columns), find_region_col(df_typed.columns))
+
+    return typed_cache.get_or_create((key, tuple(mapping), 'cube'), build)
+
+
+# --- Streaming Ingest ---
+def read_csv_header(source):
+    # Column names only; rewinds file-like sources so they can be read again
+    columns = pd.read_csv(source, nrows=0).columns.tolist()
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    return columns
+
+
+def stream_audit_csv(source, mapping, chunksize=STREAM_CHUNK_ROWS):
+    # Constant-memory alternative to load_typed_audit for CSVs: reads only the
+    # mapped columns (plus the date column) chunk by chunk and folds each chunk
+    # into running per-auditor counts and a running min/max visit date. The only
+    # state that grows is the set of distinct (auditor, visit) pairs that the
+    # Audited Visit nunique needs.
+    col_assigned, col_visit, col_reaudit, col_mismatch = mapping
+    date_col = find_date_col(read_csv_header(source))
+    usecols = list(dict.fromkeys([*mapping, *([date_col] if date_col else [])]))
+    # Visit ids as strings so every chunk agrees on one type for the distinct count
+    dtype = {col_assigned: 'string', col_visit: 'string'}
+
+    counts = None
+    visit_pairs = []
+    pending_rows = 0
+    compact_at = chunksize
+    start_date = end_date = None
+    dates_ok = date_col is not None
+
+    for chunk in pd.read_csv(source, usecols=usecols, dtype=dtype, chunksize=chunksize):
+        chunk = coerce_audit_types(chunk, col_reaudit, col_mismatch)
+        reaudited = chunk[col_reaudit] == True
+
+        chunk_counts = pd.DataFrame({
+            'auditor': chunk[col_assigned],
+            're_audit_visited': chunk[col_reaudit],
+            'mismatch_found_no_audit': reaudited & chunk[col_mismatch].eq(False),
+            'mismatch_found_yes_audit': reaudited & chunk[col_mismatch].eq(True),
+        }).groupby('auditor').sum()
+        counts = chunk_counts if counts is None else counts.add(chunk_counts, fill_value=0)
+
+        pairs = pd.DataFrame({'auditor': chunk[col_assigned], 'visit': chunk[col_visit]}).dropna().drop_duplicates()
+        visit_pairs.append(pairs)
+        pending_rows += len(pairs)
+        if pending_rows > compact_at:
+            visit_pairs = [pd.concat(visit_pairs, ignore_index=True).drop_duplicates()]
+            pending_rows = len(visit_pairs[0])
+            compact_at = max(chunksize, 2 * pending_rows)
+
+        if dates_ok:
+            # Same all-or-nothing rule as the in-memory path: one unparsable chunk drops the date header
+            try:
+                dates = pd.to_datetime(chunk[date_col]).dropna()
+            except Exception:
+                dates_ok = False
+                start_date = end_date = None
+                continue
+            if not dates.empty:
+                start_date = dates.min() if start_date is None else min(start_date, dates.min())
+                end_date = dates.max() if end_date is None else max(end_date, dates.max())
+
+    if counts is None:
+        counts = pd.DataFrame(columns=['re_audit_visited', 'mismatch_found_no_audit', 'mismatch_found_yes_audit'])
+
+    pairs = pd.concat(visit_pairs, ignore_index=True).drop_duplicates() if visit_pairs else pd.DataFrame(columns=['auditor', 'visit'])
+    audit_visited = pairs.groupby('auditor').size().reindex(counts.index, fill_value=0)
+    auditor_performance = pd.concat([audit_visited.rename('audit_visited'), counts], axis=1).sort_index()
+
+    header_title, header_date_range = format_date_header(start_date, end_date)
+    return {
+        'df': None,
+        'header_title': header_title,
+        'header_date_range': header_date_range,
+        'performance': finalize_performance(auditor_performance, col_assigned),
+        'memory_mb': None,
+    }
+
+
+def load_streamed_audit(key, audit_file, mapping):
+    # Streaming counterpart of load_typed_audit for uploads, cached the same way
+    def build():
+        audit_file.seek(0)
+        with stage('stream_csv'):
+            return stream_audit_csv(audit_file, mapping)
+
+    return typed_cache.get_or_create((key, tuple(mapping), 'stream'), build)
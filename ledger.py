@@ -0,0 +1,228 @@
+import argparse
+import os
+import sqlite3
+import sys
+from contextlib import closing
+from datetime import datetime
+
+import pandas as pd
+
+from engine import (
+    coerce_audit_types, detect_mapping, extract_date_header, finalize_performance, find_date_col,
+    format_date_header, visit_keys,
+)
+
+LEDGER_PATH = 'payroll_ledger.sqlite'
+# visit_date for rows whose date is missing or unparsable (NULL would break the daily key)
+UNDATED = ''
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS seen_visits (
+    auditor TEXT NOT NULL,
+    visit_id TEXT NOT NULL,
+    visit_date TEXT NOT NULL,
+    source TEXT,
+    ingested_at TEXT NOT NULL,
+    PRIMARY KEY (auditor, visit_id)
+);
+CREATE TABLE IF NOT EXISTS daily (
+    auditor TEXT NOT NULL,
+    visit_date TEXT NOT NULL,
+    audit_visited INTEGER NOT NULL,
+    re_audit_visited INTEGER NOT NULL,
+    mismatch_found_no_audit INTEGER NOT NULL,
+    mismatch_found_yes_audit INTEGER NOT NULL,
+    PRIMARY KEY (auditor, visit_date)
+);
+"""
+
+COUNT_COLUMNS = ['audit_visited', 're_audit_visited', 'mismatch_found_no_audit', 'mismatch_found_yes_audit']
+
+
+class PayrollLedger:
+    # Local SQLite store of per-auditor, per-visit-date counts plus every
+    # (auditor, visit id) pair already counted. Uploads only fold in visits the
+    # ledger has not seen, so overlapping monthly exports are never double paid.
+    #
+    # A visit is attributed to the earliest date it appears on, and all of its
+    # rows count on that day, so any date range includes or excludes it whole.
+    # Rows without a visit id cannot be de-duplicated and are left out.
+
+    def __init__(self, path=LEDGER_PATH):
+        self.path = path
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.executescript(SCHEMA)
+        return conn
+
+    # --- Ingest ---
+    def ingest(self, df_audit, mapping, date_col=None, source=None):
+        # df_audit must already be typed (coerce_audit_types / extract_date_header)
+        col_assigned, col_visit, col_reaudit, col_mismatch = mapping
+        reaudited = df_audit[col_reaudit] == True
+        rows = pd.DataFrame({
+            'auditor': df_audit[col_assigned].astype('string'),
+            'visit_id': visit_keys(df_audit[col_visit]),
+            'visit_date': pd.to_datetime(df_audit[date_col], errors='coerce') if date_col else pd.NaT,
+            're_audit_visited': df_audit[col_reaudit].astype('int64'),
+            'mismatch_found_no_audit': (reaudited & df_audit[col_mismatch].eq(False)).astype('int64'),
+            'mismatch_found_yes_audit': (reaudited & df_audit[col_mismatch].eq(True)).astype('int64'),
+        })
+        skipped_rows = int(rows[['auditor', 'visit_id']].isna().any(axis=1).sum())
+        rows = rows.dropna(subset=['auditor', 'visit_id'])
+
+        # One date per visit: the earliest dated row wins. Taken on datetime64 (a
+        # vectorised min; NaT is skipped) and only the per-visit result becomes text.
+        first_dates = rows.groupby(['auditor', 'visit_id'], sort=False)['visit_date'].min()
+        pairs = _date_keys(first_dates).reset_index()
+
+        with closing(self._connect()) as conn, conn:
+            conn.execute("CREATE TEMP TABLE incoming (auditor TEXT, visit_id TEXT, PRIMARY KEY (auditor, visit_id))")
+            conn.executemany("INSERT INTO incoming VALUES (?, ?)", zip(*_columns(pairs, 'auditor', 'visit_id')))
+            seen = pd.read_sql_query(
+                "SELECT i.auditor, i.visit_id FROM incoming i JOIN seen_visits s USING (auditor, visit_id)", conn
+            )
+            conn.execute("DROP TABLE incoming")
+
+            seen_index = pd.MultiIndex.from_frame(seen) if len(seen) else None
+            pair_index = pd.MultiIndex.from_frame(pairs[['auditor', 'visit_id']])
+            new_pairs = pairs[~pair_index.isin(seen_index)] if seen_index is not None else pairs
+            if new_pairs.empty:
+                return {'new_visits': 0, 'known_visits': len(pairs), 'skipped_rows': skipped_rows}
+
+            # Fold every row of the unseen visits onto their visit date
+            new_rows = rows.drop(columns='visit_date').merge(new_pairs, on=['auditor', 'visit_id'])
+            daily = new_rows.groupby(['auditor', 'visit_date']).agg(
+                audit_visited=('visit_id', 'nunique'),
+                re_audit_visited=('re_audit_visited', 'sum'),
+                mismatch_found_no_audit=('mismatch_found_no_audit', 'sum'),
+                mismatch_found_yes_audit=('mismatch_found_yes_audit', 'sum'),
+            ).reset_index()
+
+            conn.executemany(
+                """INSERT INTO daily VALUES (?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (auditor, visit_date) DO UPDATE SET
+                       audit_visited = audit_visited + excluded.audit_visited,
+                       re_audit_visited = re_audit_visited + excluded.re_audit_visited,
+                       mismatch_found_no_audit = mismatch_found_no_audit + excluded.mismatch_found_no_audit,
+                       mismatch_found_yes_audit = mismatch_found_yes_audit + excluded.mismatch_found_yes_audit""",
+                [(a, d, *map(int, counts)) for a, d, *counts in daily.itertuples(index=False, name=None)],
+            )
+            ingested_at = datetime.now().isoformat(timespec='seconds')
+            conn.executemany(
+                "INSERT INTO seen_visits VALUES (?, ?, ?, ?, ?)",
+                [(a, v, d, source, ingested_at) for a, v, d in zip(*_columns(new_pairs, 'auditor', 'visit_id', 'visit_date'))],
+            )
+
+        return {'new_visits': len(new_pairs), 'known_visits': len(pairs) - len(new_pairs), 'skipped_rows': skipped_rows}
+
+    # --- Reporting ---
+    def performance(self, start=None, end=None, col_assigned='Auditor Name'):
+        # Same frame as engine.aggregate_auditor_performance, built from stored counts.
+        # start/end are dates (inclusive); undated visits only count when no range is given.
+        where, params = _date_filter(start, end)
+        with closing(self._connect()) as conn:
+            df = pd.read_sql_query(
+                f"""SELECT auditor, SUM(audit_visited) AS audit_visited, SUM(re_audit_visited) AS re_audit_visited,
+                           SUM(mismatch_found_no_audit) AS mismatch_found_no_audit,
+                           SUM(mismatch_found_yes_audit) AS mismatch_found_yes_audit
+                    FROM daily {where} GROUP BY auditor ORDER BY auditor""",
+                conn, params=params,
+            )
+        return finalize_performance(df.set_index('auditor')[COUNT_COLUMNS], col_assigned)
+
+    def date_header(self, start=None, end=None):
+        where, params = _date_filter(start, end, dated_only=True)
+        with closing(self._connect()) as conn:
+            first, last = conn.execute(f"SELECT MIN(visit_date), MAX(visit_date) FROM daily {where}", params).fetchone()
+        return format_date_header(*(pd.Timestamp(d) if d else None for d in (first, last)))
+
+    def stats(self):
+        with closing(self._connect()) as conn:
+            visits, auditors = conn.execute("SELECT COUNT(*), COUNT(DISTINCT auditor) FROM seen_visits").fetchone()
+            first, last = conn.execute(
+                "SELECT MIN(visit_date), MAX(visit_date) FROM daily WHERE visit_date != ?", (UNDATED,)
+            ).fetchone()
+        return {
+            'visits': visits,
+            'auditors': auditors,
+            'first_date': pd.Timestamp(first).date() if first else None,
+            'last_date': pd.Timestamp(last).date() if last else None,
+        }
+
+
+def _columns(df, *names):
+    # Plain Python lists for sqlite parameters; iterating Arrow-backed columns
+    # row by row (itertuples) costs a scalar conversion per cell
+    return [df[name].tolist() for name in names]
+
+
+def _date_keys(dates):
+    dates = pd.to_datetime(dates, errors='coerce')
+    return dates.dt.strftime('%Y-%m-%d').fillna(UNDATED)
+
+
+def _date_filter(start, end, dated_only=False):
+    clauses, params = [], []
+    if start is not None or end is not None or dated_only:
+        clauses.append("visit_date != ?")
+        params.append(UNDATED)
+    if start is not None:
+        clauses.append("visit_date >= ?")
+        params.append(pd.Timestamp(start).strftime('%Y-%m-%d'))
+    if end is not None:
+        clauses.append("visit_date <= ?")
+        params.append(pd.Timestamp(end).strftime('%Y-%m-%d'))
+    return ("WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+# --- Command Line ---
+def main(argv=None):
+    from export import ReportExports
+    from ingest import read_audit_file
+    from mfs import SHEET_URL
+
+    parser = argparse.ArgumentParser(description="Maintain the incremental payroll ledger.")
+    parser.add_argument('--ledger', default=LEDGER_PATH, help=f"SQLite ledger file (default: {LEDGER_PATH})")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    ingest_cmd = commands.add_parser('ingest', help="Fold unseen visits from audit files into the ledger")
+    ingest_cmd.add_argument('files', nargs='+')
+
+    report_cmd = commands.add_parser('report', help="Write a salary report from the stored counts")
+    report_cmd.add_argument('output', help="Output file (.xlsx, .csv, .parquet or .json)")
+    report_cmd.add_argument('--start', help="First visit date (YYYY-MM-DD)")
+    report_cmd.add_argument('--end', help="Last visit date (YYYY-MM-DD)")
+    report_cmd.add_argument('--unit-price', type=int, default=3)
+    report_cmd.add_argument('--mfs', default=SHEET_URL, help="MFS CSV path or URL")
+    args = parser.parse_args(argv)
+
+    ledger = PayrollLedger(args.ledger)
+
+    if args.command == 'ingest':
+        for path in args.files:
+            with open(path, 'rb') as f:
+                df_audit = read_audit_file(path.lower(), f.read())
+            mapping = detect_mapping(df_audit.columns.tolist())
+            df_audit = coerce_audit_types(df_audit, mapping[2], mapping[3])
+            df_audit, _, _ = extract_date_header(df_audit)
+            result = ledger.ingest(df_audit, mapping, find_date_col(df_audit.columns), source=os.path.basename(path))
+            print(f"{path}: {result['new_visits']} new visits, {result['known_visits']} already in ledger, "
+                  f"{result['skipped_rows']} rows without auditor/visit id")
+        return 0
+
+    from cli import load_mfs
+    from engine import build_report
+
+    report_df = build_report(ledger.performance(args.start, args.end), 'Auditor Name', args.unit_price, load_mfs(args.mfs))
+    header_title, header_date_range = ledger.date_header(args.start, args.end)
+    fmt = os.path.splitext(args.output)[1].lstrip('.').lower()
+    with open(args.output, 'wb') as f:
+        f.write(ReportExports(report_df, header_title, header_date_range, args.unit_price).render(fmt))
+    print(f"{header_title} [{header_date_range}] -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
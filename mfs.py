@@ -0,0 +1,186 @@
+import io
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime
+
+import pandas as pd
+
+# Google Sheets MFS Integration
+SHEET_ID = "1v8w8O-s3wKVfBXeEDU9Sd7F-nmSlQRV39mDs1iZxsSc"
+SHEET_URL = f"https://docs.google.com/spreadsheets/d/{SHEET_ID}/export?format=csv"
+
+
+class MFSLoader:
+    # Serves the MFS sheet from memory, revalidates it in the background once the
+    # TTL expires and keeps the last good copy on disk for offline starts.
+
+    def __init__(self, url, cache_dir='.mfs_cache', ttl=300, timeout=10):
+        self.url = url
+        self.ttl = ttl
+        self.timeout = timeout
+        self.cache_dir = cache_dir
+        self.snapshot_path = os.path.join(cache_dir, 'mfs_snapshot.csv')
+        self.meta_path = os.path.join(cache_dir, 'mfs_snapshot.json')
+
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._df = None
+        self._meta = {}
+        self._checked_at = 0.0
+        self._origin = None
+        self.last_error = None
+
+    # --- Public API ---
+    def load(self):
+        # Returns (DataFrame, status dict). Only blocks on the network when there
+        # is neither an in-memory nor an on-disk copy to serve.
+        with self._lock:
+            if self._df is None:
+                self._load_snapshot()
+
+            if self._df is None:
+                source = 'network'
+                hit = False
+            elif time.time() - self._checked_at < self.ttl:
+                return self._df, self._status('memory', True)
+            else:
+                # Serve the last good copy now, revalidate behind it
+                source = self._origin
+                hit = True
+
+        if not hit:
+            self.refresh()
+            with self._lock:
+                if self._df is None:
+                    raise RuntimeError(f"MFS data unavailable: {self.last_error}")
+                return self._df, self._status('network', hit)
+
+        self._refresh_in_background()
+        with self._lock:
+            return self._df, self._status(source, hit)
+
+    def refresh(self):
+        # Conditional GET against the sheet; a 304 only bumps the check time.
+        request = urllib.request.Request(self.url)
+        with self._lock:
+            if self._df is not None and self._meta.get('etag'):
+                request.add_header('If-None-Match', self._meta['etag'])
+            if self._df is not None and self._meta.get('last_modified'):
+                request.add_header('If-Modified-Since', self._meta['last_modified'])
+
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                content = response.read()
+                headers = response.headers
+            df = parse_mfs_csv(content)
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                with self._lock:
+                    self._checked_at = time.time()
+                    self._origin = 'memory'
+                    self._meta['synced_at'] = _now()
+                    self._write_meta()
+                    self.last_error = None
+                return False
+            self._record_failure(e)
+            return False
+        except Exception as e:
+            self._record_failure(e)
+            return False
+
+        with self._lock:
+            self._df = df
+            self._checked_at = time.time()
+            self._origin = 'memory'
+            self._meta = {
+                'etag': headers.get('ETag'),
+                'last_modified': headers.get('Last-Modified'),
+                'synced_at': _now(),
+            }
+            self.last_error = None
+            self._write_snapshot(content)
+        return True
+
+    # --- Internals ---
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=run, name='mfs-refresh', daemon=True).start()
+
+    def _record_failure(self, error):
+        with self._lock:
+            self.last_error = error
+            # Back off for a full TTL before hitting a failing sheet again
+            self._checked_at = time.time()
+
+    def _status(self, source, hit):
+        return {
+            'source': source,
+            'cache_hit': hit,
+            'last_synced': self._meta.get('synced_at'),
+            'offline': self.last_error is not None,
+        }
+
+    def _load_snapshot(self):
+        if not os.path.exists(self.snapshot_path):
+            return
+        try:
+            with open(self.snapshot_path, 'rb') as f:
+                self._df = parse_mfs_csv(f.read())
+            self._origin = 'disk'
+            if os.path.exists(self.meta_path):
+                with open(self.meta_path) as f:
+                    self._meta = json.load(f)
+        except Exception:
+            self._df = None
+            self._meta = {}
+        # A disk copy is always revalidated on first use
+        self._checked_at = 0.0
+
+    def _write_snapshot(self, content):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = self.snapshot_path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, self.snapshot_path)
+            self._write_meta()
+        except OSError:
+            pass
+
+    def _write_meta(self):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(self.meta_path, 'w') as f:
+                json.dump(self._meta, f)
+        except OSError:
+            pass
+
+
+# The app's shared loader. It lives here rather than in app.py: Streamlit re-runs
+# the page script as a fresh __main__ module on every rerun, while imported
+# modules (and this instance with its in-memory copy) persist.
+sheet_loader = MFSLoader(SHEET_URL)
+
+
+def parse_mfs_csv(content):
+    # The sheet has two banner rows above the real header
+    return pd.read_csv(io.BytesIO(content), header=2)
+
+
+def _now():
+    return datetime.now().strftime('%d-%b-%Y %H:%M:%S')
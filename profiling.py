@@ -0,0 +1,128 @@
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+# Structured stage logs: one JSON object per line
+profile_logger = logging.getLogger('auditor_salary.profile')
+
+_active_profiler = contextvars.ContextVar('active_profiler', default=None)
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+RSS_SAMPLE_SECONDS = 0.005
+
+
+def current_rss_mb():
+    # Resident set size of this process, or None where /proc is unavailable.
+    # RSS (not tracemalloc) so Arrow-backed strings and C buffers are counted too.
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE / 2**20
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class _PeakSampler:
+    # Polls RSS in a background thread for the duration of one stage
+    def __init__(self):
+        self.peak = current_rss_mb()
+        self._stop = threading.Event()
+        self._thread = None
+        if self.peak is not None:
+            self._thread = threading.Thread(target=self._run, name='rss-sampler', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(RSS_SAMPLE_SECONDS):
+            self.peak = max(self.peak, current_rss_mb() or 0)
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self.peak = max(self.peak, current_rss_mb() or 0)
+        return self.peak
+
+
+class StageProfiler:
+    # Collects one record per pipeline stage (seconds, rows, peak RSS) for the
+    # code run inside `with profiler:`. Stages are marked with profiling.stage(),
+    # which is a no-op when no profiler is active.
+
+    def __init__(self, run=None, records=None):
+        self.run = run
+        self.records = list(records or [])
+        self._token = None
+
+    def __enter__(self):
+        self._token = _active_profiler.set(self)
+        return self
+
+    def __exit__(self, *exc):
+        _active_profiler.reset(self._token)
+        return False
+
+    def add(self, name, seconds, rows=None, peak_rss_mb=None):
+        self.records.append({
+            'stage': name,
+            'seconds': round(seconds, 6),
+            'rows': rows,
+            'peak_rss_mb': None if peak_rss_mb is None else round(peak_rss_mb, 1),
+        })
+
+    def total_seconds(self):
+        return sum(record['seconds'] for record in self.records)
+
+    def frame(self):
+        columns = ['stage', 'seconds', 'rows', 'peak_rss_mb']
+        df = pd.DataFrame(self.records, columns=columns)
+        return df.astype({'seconds': 'float64', 'rows': 'Int64', 'peak_rss_mb': 'float64'})
+
+    def log(self, **context):
+        # One JSON line per stage plus a run summary on the profile logger
+        timestamp = datetime.now().isoformat(timespec='milliseconds')
+        base = {'run': self.run, **context}
+        for record in self.records:
+            profile_logger.info(json.dumps({'ts': timestamp, 'event': 'stage', **base, **record}, default=str))
+        profile_logger.info(json.dumps({
+            'ts': timestamp, 'event': 'run', **base,
+            'stages': len(self.records),
+            'seconds': round(self.total_seconds(), 6),
+            'peak_rss_mb': max((r['peak_rss_mb'] for r in self.records if r['peak_rss_mb'] is not None), default=None),
+        }, default=str))
+
+
+@contextmanager
+def stage(name, rows=None):
+    # Times the block under the active profiler. Yields a dict; set info['rows']
+    # inside the block when the row count is only known afterwards.
+    profiler = _active_profiler.get()
+    info = {'rows': rows}
+    if profiler is None:
+        yield info
+        return
+
+    sampler = _PeakSampler()
+    start = time.perf_counter()
+    try:
+        yield info
+    finally:
+        elapsed = time.perf_counter() - start
+        profiler.add(name, elapsed, info['rows'], sampler.stop())
+
+
+def enable_json_logs(stream=None):
+    # Attach a bare '%(message)s' handler once, so each stage record is a JSON line
+    if not any(getattr(h, '_profile_json', False) for h in profile_logger.handlers):
+        handler = logging.StreamHandler(stream or sys.stderr)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        handler._profile_json = True
+        profile_logger.addHandler(handler)
+    profile_logger.setLevel(logging.INFO)
+    profile_logger.propagate = False
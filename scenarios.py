@@ -0,0 +1,143 @@
+import argparse
+import io
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from engine import FIXED_SHARE, excel_round
+from export import XLSX_MIME
+
+# Upper bound on scenarios x auditors: each per-auditor array holds that many
+# float64 cells (5M cells = 40 MB per array)
+MAX_SWEEP_CELLS = 5_000_000
+SWEEP_FORMATS = {
+    # format: (mime, file extension)
+    'csv': ("text/csv", 'csv'),
+    'xlsx': (XLSX_MIME, 'xlsx'),
+}
+
+
+def scenario_grid(start, stop, step):
+    # Inclusive start..stop in steps; rounded so 0.1-steps do not drift (0.30000000000000004)
+    if step <= 0 or stop < start:
+        return np.array([float(start)])
+    count = int(np.floor((stop - start) / step + 1e-9)) + 1
+    return np.round(start + step * np.arange(count), 9)
+
+
+class PayrollSweep:
+    # Per-auditor payouts for every (unit price, fixed share) pair, computed in one
+    # broadcast pass over the aggregated counts with the rounding of the Excel
+    # report formulas:
+    #   Max Payable = ROUND(visits * price), Fixed = ROUND(Max * share),
+    #   Variable = ROUND((Max * (1 - share)) * (1 - mismatch rate)).
+    # Arrays are shaped (unit prices, fixed shares, auditors).
+
+    def __init__(self, auditor_performance, col_assigned, unit_prices, fixed_shares):
+        self.auditors = auditor_performance[col_assigned].to_numpy()
+        self.unit_prices = np.asarray(unit_prices, dtype='float64')
+        self.fixed_shares = np.asarray(fixed_shares, dtype='float64')
+        visits = auditor_performance['audit_visited'].to_numpy(dtype='float64')
+        kept = 1 - auditor_performance['mismatch_rate'].to_numpy(dtype='float64')
+
+        # The variable share is rounded like a typed-in literal (1 - 0.7 -> 0.3, not 0.30000000000000004)
+        fixed_share = self.fixed_shares[None, :, None]
+        variable_share = np.round(1 - fixed_share, 9)
+        self.max_payable = excel_round(self.unit_prices[:, None] * visits)[:, None, :]
+        self.fixed = excel_round(self.max_payable * fixed_share)
+        self.variable = excel_round((self.max_payable * variable_share) * kept)
+        self.actual = self.fixed + self.variable
+
+    @property
+    def scenarios(self):
+        return len(self.unit_prices) * len(self.fixed_shares)
+
+    # --- Reporting ---
+    def totals(self):
+        # One row per scenario: summed payouts (the report's GRAND TOTAL row)
+        prices, shares = np.meshgrid(self.unit_prices, self.fixed_shares, indexing='ij')
+        max_total = np.broadcast_to(self.max_payable.sum(axis=2), prices.shape)
+        return pd.DataFrame({
+            'unit_price': prices.ravel(),
+            'fixed_share': shares.ravel(),
+            'max_payable': max_total.ravel().astype('int64'),
+            'fixed_payable': self.fixed.sum(axis=2).ravel().astype('int64'),
+            'variable_payable': self.variable.sum(axis=2).ravel().astype('int64'),
+            'actual_payable': self.actual.sum(axis=2).ravel().astype('int64'),
+        })
+
+    def sensitivity(self, value='actual_payable'):
+        # Unit price x fixed share table of one total, columns labelled like the report ('Fixed 75%')
+        table = self.totals().pivot(index='unit_price', columns='fixed_share', values=value)
+        table.columns = [f"Fixed {round(share * 100, 4):g}%" for share in table.columns]
+        table.index.name = 'Unit Price'
+        return table
+
+    def auditor_payouts(self, unit_price, fixed_share=FIXED_SHARE):
+        # Per-auditor payouts of the grid scenario closest to (unit_price, fixed_share)
+        i = int(np.abs(self.unit_prices - unit_price).argmin())
+        j = int(np.abs(self.fixed_shares - fixed_share).argmin())
+        return pd.DataFrame({
+            'auditor_name': self.auditors,
+            'unit_price': self.unit_prices[i],
+            'fixed_share': self.fixed_shares[j],
+            'max_payable': self.max_payable[i, 0].astype('int64'),
+            'fixed_payable': self.fixed[i, j].astype('int64'),
+            'variable_payable': self.variable[i, j].astype('int64'),
+            'actual_payable': self.actual[i, j].astype('int64'),
+        })
+
+
+# --- Exports ---
+def render_sweep(sweep, fmt, header_title='', header_date_range=''):
+    # csv: one row per scenario; xlsx: sensitivity table plus the scenario list
+    if fmt == 'csv':
+        return sweep.totals().to_csv(index=False).encode('utf-8')
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+        pd.DataFrame({'': [header_title, f"[{header_date_range}]"]}).to_excel(
+            writer, sheet_name='Sensitivity', index=False, header=False)
+        sweep.sensitivity().to_excel(writer, sheet_name='Sensitivity', startrow=3)
+        sweep.totals().to_excel(writer, sheet_name='Scenarios', index=False)
+    return buffer.getvalue()
+
+
+def sweep_filename(header_title, fmt):
+    return f"Payroll_What_If_{header_title.split('- ')[-1]}.{SWEEP_FORMATS[fmt][1]}"
+
+
+# --- Command Line ---
+def main(argv=None):
+    from engine import aggregate_auditor_performance, compact_audit_frame, detect_mapping, extract_date_header
+    from ingest import read_audit_file
+
+    parser = argparse.ArgumentParser(description="Total payouts over a grid of unit prices and fixed/variable splits.")
+    parser.add_argument('audit_file', help="Audit export (CSV/XLSX)")
+    parser.add_argument('output', help="Output file (.csv or .xlsx)")
+    parser.add_argument('--prices', type=float, nargs=3, default=[1, 10, 0.5], metavar=('START', 'STOP', 'STEP'))
+    parser.add_argument('--fixed-shares', type=float, nargs=3, default=[0.5, 1.0, 0.05], metavar=('START', 'STOP', 'STEP'))
+    args = parser.parse_args(argv)
+
+    with open(args.audit_file, 'rb') as f:
+        df_audit = read_audit_file(args.audit_file, f.read())
+    mapping = detect_mapping(df_audit.columns.tolist())
+    df_audit, header_title, header_date_range = extract_date_header(compact_audit_frame(df_audit, *mapping))
+    auditor_performance = aggregate_auditor_performance(df_audit, *mapping)
+
+    start = time.perf_counter()
+    sweep = PayrollSweep(auditor_performance, mapping[0], scenario_grid(*args.prices), scenario_grid(*args.fixed_shares))
+    elapsed = time.perf_counter() - start
+    fmt = os.path.splitext(args.output)[1].lstrip('.').lower()
+    if fmt not in SWEEP_FORMATS:
+        parser.error("output must end in .csv or .xlsx")
+    with open(args.output, 'wb') as f:
+        f.write(render_sweep(sweep, fmt, header_title, header_date_range))
+    print(f"{sweep.scenarios:,} scenarios x {len(sweep.auditors)} auditors in {elapsed * 1000:.1f} ms -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
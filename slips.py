@@ -0,0 +1,264 @@
+import argparse
+import io
+import multiprocessing
+import os
+import re
+import smtplib
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from email.message import EmailMessage
+from itertools import repeat
+
+import pandas as pd
+
+from cache import LRUCache
+from engine import normalize_names
+from export import XLSX_MIME, report_fingerprint, write_excel_report
+
+# Auditors per worker task: enough to amortise the process hop, small enough to balance
+SLIP_BATCH_ROWS = 25
+MAIL_BATCH_SIZE = 50
+
+# Rendered slips of the last reports, shared by the ZIP download and the mailer
+slip_cache = LRUCache(max_entries=2)
+
+
+# --- Rendering ---
+def slip_filename(auditor, header_title):
+    safe_name = re.sub(r'[^\w.-]+', '_', str(auditor)).strip('_') or 'auditor'
+    return f"Salary_Slip_{safe_name}_{header_title.split('- ')[-1]}.xlsx"
+
+
+def _render_batch(rows, header_title, header_date_range):
+    # Worker task: one single-row report (same styling and formulas) per auditor
+    return [
+        (auditor, slip_filename(auditor, header_title),
+         write_excel_report(rows.iloc[[i]], header_title, header_date_range, has_total=False))
+        for i, auditor in enumerate(rows['Auditor Name'])
+    ]
+
+
+def render_slips(report_df, header_title, header_date_range, workers=None, batch_rows=SLIP_BATCH_ROWS):
+    # [(auditor, filename, xlsx bytes)] in report order, rendered in a process
+    # pool (openpyxl is pure Python, so threads would serialise on the GIL).
+    # Workers come from a forkserver: forking the multi-threaded Streamlit server
+    # directly can deadlock a child on a lock another thread held.
+    rows = report_df[report_df['Auditor Name'] != 'GRAND TOTAL']
+    batches = [rows.iloc[i:i + batch_rows] for i in range(0, len(rows), batch_rows)]
+    if workers == 1 or len(batches) <= 1:
+        results = [_render_batch(batch, header_title, header_date_range) for batch in batches]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('forkserver')) as pool:
+            results = list(pool.map(_render_batch, batches, repeat(header_title), repeat(header_date_range)))
+    return [slip for batch in results for slip in batch]
+
+
+def cached_slips(report_df, header_title, header_date_range, workers=None):
+    key = (report_fingerprint(report_df), header_title, header_date_range)
+    return slip_cache.get_or_create(key, lambda: render_slips(report_df, header_title, header_date_range, workers))
+
+
+def zip_slips(slips):
+    # In-memory archive for bulk download; .xlsx is already deflated, so members are stored
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archive:
+        for _, filename, data in slips:
+            archive.writestr(filename, data)
+    return buffer.getvalue()
+
+
+# --- Recipients ---
+def find_email_col(columns):
+    return next((col for col in columns if 'mail' in col.lower()), None)
+
+
+def slip_recipients(df):
+    # {normalised auditor name: address} from any frame with 'Auditor Name' and an
+    # e-mail column (the MFS sheet or a separate recipients CSV)
+    email_col = find_email_col(df.columns)
+    if email_col is None or 'Auditor Name' not in df.columns:
+        return {}
+    pairs = df[['Auditor Name', email_col]].dropna().astype(str)
+    pairs = pairs[pairs[email_col].str.contains('@')]
+    return dict(zip(normalize_names(pairs['Auditor Name']), pairs[email_col].str.strip()))
+
+
+def slip_message(sender, recipient, auditor, filename, data, header_title, header_date_range):
+    message = EmailMessage()
+    message['From'] = sender
+    message['To'] = recipient
+    message['Subject'] = f"{header_title} - {auditor}"
+    message.set_content(
+        f"Dear {auditor},\n\nPlease find your salary slip attached.\n[{header_date_range}]\n\nGP Audit Team\n"
+    )
+    maintype, subtype = XLSX_MIME.split('/')
+    message.add_attachment(data, maintype=maintype, subtype=subtype, filename=filename)
+    return message
+
+
+# --- Delivery ---
+class SlipMailer:
+    # Sends every slip over one reused SMTP connection. Between batches the
+    # connection is probed with NOOP and re-opened if the server dropped it.
+    # Dropped connections (on a fresh connection) and 4xx replies are retried with
+    # exponential backoff; 5xx replies fail that message only.
+
+    def __init__(self, host='localhost', port=25, username=None, password=None, starttls=False, timeout=30,
+                 batch_size=MAIL_BATCH_SIZE, retries=3, backoff=1.0):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.retries = retries
+        self.backoff = backoff
+        self._smtp = None
+        self.connections = 0
+
+    def send(self, messages, progress=None):
+        # messages: [(key, EmailMessage)]; progress(done, total) is called after each batch.
+        # Returns {'sent': count, 'failed': {key: error}}. Failing to connect at all raises.
+        messages = list(messages)
+        sent = 0
+        failed = {}
+        try:
+            if messages:
+                self._connect()
+            for start in range(0, len(messages), self.batch_size):
+                if self._smtp is not None and not self._alive():
+                    self._close()
+                for key, message in messages[start:start + self.batch_size]:
+                    error = self._send_one(message)
+                    if error is None:
+                        sent += 1
+                    else:
+                        failed[key] = error
+                if progress is not None:
+                    progress(min(start + self.batch_size, len(messages)), len(messages))
+        finally:
+            self._close()
+        return {'sent': sent, 'failed': failed}
+
+    def _send_one(self, message):
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            try:
+                if self._smtp is None:
+                    self._connect()
+                self._smtp.send_message(message)
+                return None
+            except smtplib.SMTPRecipientsRefused as e:
+                error = f"recipient refused: {e.recipients}"
+                if all(code >= 500 for code, _ in e.recipients.values()):
+                    return error
+            except smtplib.SMTPResponseException as e:
+                reply = e.smtp_error.decode(errors='replace') if isinstance(e.smtp_error, bytes) else e.smtp_error
+                error = f"{e.smtp_code} {reply}"
+                if e.smtp_code >= 500:
+                    return error
+            except (smtplib.SMTPException, OSError) as e:
+                # Dropped or broken connection: start over on a new one
+                error = str(e) or type(e).__name__
+                self._close()
+        return error
+
+    def _connect(self):
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            smtp.starttls()
+        if self.username:
+            smtp.login(self.username, self.password or '')
+        self._smtp = smtp
+        self.connections += 1
+
+    def _alive(self):
+        try:
+            return self._smtp.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def _close(self):
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        self._smtp = None
+
+
+def send_slips(slips, recipients, mailer, sender, header_title, header_date_range, progress=None):
+    # Mails each rendered slip to its auditor; auditors without an address are listed, not sent
+    keys = normalize_names(pd.Series([auditor for auditor, _, _ in slips], dtype=object))
+    addresses = [recipients.get(key) for key in keys]
+    messages = [
+        (auditor, slip_message(sender, address, auditor, filename, data, header_title, header_date_range))
+        for (auditor, filename, data), address in zip(slips, addresses) if address
+    ]
+    result = mailer.send(messages, progress)
+    result['no_address'] = [auditor for (auditor, _, _), address in zip(slips, addresses) if not address]
+    return result
+
+
+# --- Command Line ---
+def main(argv=None):
+    from cli import load_mfs
+    from engine import detect_mapping, generate_report
+    from ingest import read_audit_file
+    from mfs import SHEET_URL
+
+    parser = argparse.ArgumentParser(description="Render one salary slip per auditor, zip them and optionally mail them.")
+    parser.add_argument('audit_file', help="Audit export (CSV/XLSX)")
+    parser.add_argument('output', help="ZIP archive of the slips")
+    parser.add_argument('--unit-price', type=int, default=3)
+    parser.add_argument('--mfs', default=SHEET_URL, help="MFS CSV path or URL")
+    parser.add_argument('--workers', type=int, default=None, help="Render processes (default: all cores)")
+    parser.add_argument('--send', action='store_true', help="Mail each slip to its auditor")
+    parser.add_argument('--recipients', help="CSV with 'Auditor Name' and an e-mail column (default: MFS sheet)")
+    parser.add_argument('--sender', default=os.environ.get('SMTP_SENDER', 'audit-team@localhost'))
+    parser.add_argument('--smtp-host', default=os.environ.get('SMTP_HOST', 'localhost'))
+    parser.add_argument('--smtp-port', type=int, default=int(os.environ.get('SMTP_PORT', 25)))
+    parser.add_argument('--smtp-user', default=os.environ.get('SMTP_USER'), help="Password is read from SMTP_PASSWORD")
+    parser.add_argument('--starttls', action='store_true')
+    parser.add_argument('--batch-size', type=int, default=MAIL_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    df_mfs = load_mfs(args.mfs)
+    with open(args.audit_file, 'rb') as f:
+        df_audit = read_audit_file(args.audit_file.lower(), f.read())
+    report_df, header_title, header_date_range = generate_report(
+        df_audit, detect_mapping(df_audit.columns.tolist()), args.unit_price, df_mfs
+    )
+
+    start = time.perf_counter()
+    slips = render_slips(report_df, header_title, header_date_range, args.workers)
+    with open(args.output, 'wb') as f:
+        f.write(zip_slips(slips))
+    elapsed = time.perf_counter() - start
+    print(f"{len(slips)} slips -> {args.output} in {elapsed:.2f}s ({len(slips) / max(elapsed, 1e-9):.0f} slips/s)")
+
+    if not args.send:
+        return 0
+
+    recipients = slip_recipients(pd.read_csv(args.recipients) if args.recipients else df_mfs)
+    mailer = SlipMailer(args.smtp_host, args.smtp_port, args.smtp_user, os.environ.get('SMTP_PASSWORD'),
+                        starttls=args.starttls, batch_size=args.batch_size)
+    start = time.perf_counter()
+    result = send_slips(slips, recipients, mailer, args.sender, header_title, header_date_range)
+    elapsed = time.perf_counter() - start
+    print(f"{result['sent']} mailed in {elapsed:.2f}s ({result['sent'] / max(elapsed, 1e-9):.0f} msgs/s, "
+          f"{mailer.connections} connection(s)), {len(result['failed'])} failed, "
+          f"{len(result['no_address'])} without an address")
+    for auditor, error in result['failed'].items():
+        print(f"FAIL  {auditor}: {error}", file=sys.stderr)
+    return 1 if result['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())